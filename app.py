@@ -1,8 +1,19 @@
-from flask import Flask, render_template, request, redirect, url_for, session, jsonify
-from werkzeug.utils import secure_filename
+from flask import Flask, render_template, request, redirect, url_for, session, jsonify, Response, make_response
 import os
-from datetime import datetime
-import database as db
+import json
+import gzip
+import time
+import random
+import hmac
+import hashlib
+import threading
+from datetime import datetime, timedelta
+from markupsafe import escape
+import repositorio as db
+import fotos
+import metricas
+import exportar
+import asignaciones
 
 app = Flask(__name__)
 app.secret_key = 'tu_clave_secreta_aqui_cambiala'  # Cámbiala por cualquier texto aleatorio
@@ -13,13 +24,225 @@ ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max
 
+# Latencia por petición y por función del backend de base de datos (ver /metrics)
+metricas.instrumentar_modulo(db)
+metricas.instrumentar_app(app)
+
 # Crear carpeta de uploads si no existe
 if not os.path.exists(UPLOAD_FOLDER):
     os.makedirs(UPLOAD_FOLDER)
 
+# ==================== COMPRESIÓN Y CACHÉ ====================
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Respuestas que merece la pena comprimir
+TIPOS_COMPRIMIBLES = ('text/', 'application/json', 'application/javascript', 'image/svg+xml')
+MIN_BYTES_COMPRIMIR = 500
+
+# Los archivos de static/ pedidos con ?v=<versión> se cachean un año; sin versión, una hora
+CACHE_ESTATICOS = 365 * 24 * 3600
+CACHE_ESTATICOS_SIN_VERSION = 3600
+
+@app.template_global()
+def estatico(filename):
+    """URL de un archivo de static/ con su versión (mtime), para poder cachearlo para siempre"""
+    try:
+        version = int(os.path.getmtime(os.path.join(app.static_folder, filename)))
+    except OSError:
+        version = 0
+    return url_for('static', filename=filename, v=version)
+
+def calcular_version_app():
+    """APP_VERSION (por ejemplo el hash del commit desplegado) o, si no está, una huella de
+    las plantillas y de static/ por fecha de modificación y tamaño"""
+    if os.environ.get('APP_VERSION'):
+        return os.environ['APP_VERSION']
+    huella = hashlib.sha1()
+    for carpeta in (app.template_folder, app.static_folder):
+        raiz = os.path.join(app.root_path, carpeta)
+        for directorio, subcarpetas, archivos in os.walk(raiz):
+            subcarpetas.sort()
+            for nombre in sorted(archivos):
+                ruta = os.path.join(directorio, nombre)
+                info = os.stat(ruta)
+                huella.update(f'{os.path.relpath(ruta, raiz)}:{info.st_mtime_ns}:{info.st_size};'.encode())
+    return huella.hexdigest()[:12]
+
+# Entra en los ETag de las páginas HTML: un despliegue con otras plantillas o
+# estáticos las invalida aunque los datos no hayan cambiado
+VERSION_APP = calcular_version_app()
+
+@app.after_request
+def cachear_estaticos(respuesta):
+    if request.endpoint == 'static' and respuesta.status_code in (200, 206, 304):
+        respuesta.cache_control.no_cache = None
+        if request.args.get('v'):
+            respuesta.cache_control.max_age = CACHE_ESTATICOS
+            respuesta.cache_control.public = True
+            respuesta.cache_control.immutable = True
+        else:
+            respuesta.cache_control.max_age = CACHE_ESTATICOS_SIN_VERSION
+    return respuesta
+
+@app.after_request
+def comprimir_respuesta(respuesta):
+    """Comprime con brotli (si está instalado) o gzip las respuestas de texto generadas por la app"""
+    if (respuesta.direct_passthrough or respuesta.is_streamed
+            or respuesta.status_code != 200
+            or 'Content-Encoding' in respuesta.headers
+            or not (respuesta.mimetype or '').startswith(TIPOS_COMPRIMIBLES)):
+        return respuesta
+
+    respuesta.vary.add('Accept-Encoding')
+    datos = respuesta.get_data()
+    if len(datos) < MIN_BYTES_COMPRIMIR:
+        return respuesta
+
+    aceptadas = request.accept_encodings
+    if brotli is not None and aceptadas['br']:
+        codificacion, datos = 'br', brotli.compress(datos, quality=5)
+    elif aceptadas['gzip']:
+        codificacion, datos = 'gzip', gzip.compress(datos, compresslevel=6)
+    else:
+        return respuesta
+
+    respuesta.set_data(datos)
+    respuesta.headers['Content-Encoding'] = codificacion
+
+    # El cuerpo cambia con la codificación: el ETag pasa a ser débil
+    etag, _ = respuesta.get_etag()
+    if etag:
+        respuesta.set_etag(etag, weak=True)
+    return respuesta
+
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+# Antigüedad máxima aceptada para la hora de un reporte que llega desde la cola offline
+MAX_RETRASO_OFFLINE = timedelta(hours=48)
+
+def momento_reporte(creado):
+    """Hora en que se rellenó el reporte según el móvil, si es creíble; si no, la actual"""
+    ahora = datetime.now()
+    try:
+        momento = datetime.strptime(creado, '%Y-%m-%d %H:%M:%S')
+    except ValueError:
+        return ahora
+    if ahora - MAX_RETRASO_OFFLINE <= momento <= ahora + timedelta(minutes=5):
+        return min(momento, ahora)
+    return ahora
+
+def momento_importado(campos):
+    """Fecha y hora de un reporte importado por el admin: obligatorias y sin límite de antigüedad"""
+    fecha = str(campos.get('fecha') or '').strip()
+    hora = str(campos.get('hora_inicio') or '').strip()
+    if not fecha or not hora:
+        raise ValueError('Los reportes importados necesitan fecha y hora_inicio')
+    formato = '%Y-%m-%d %H:%M:%S' if hora.count(':') == 2 else '%Y-%m-%d %H:%M'
+    try:
+        momento = datetime.strptime(f'{fecha} {hora}', formato)
+    except ValueError:
+        raise ValueError(f'Fecha u hora no válidas: {fecha} {hora}')
+    if momento > datetime.now() + timedelta(minutes=5):
+        raise ValueError(f'Fecha futura: {fecha} {hora}')
+    return momento
+
+def reporte_a_dict(reporte):
+    """Convierte una fila de obtener_reportes_hoy en un dict con nombres de campo"""
+    return {
+        'id': reporte[0],
+        'habitacion': reporte[1],
+        'camarera': reporte[2],
+        'hora_inicio': reporte[3],
+        'estado': reporte[4],
+        'observaciones': reporte[5],
+        'foto': reporte[6],
+        'aprobado': reporte[7]
+    }
+
+def detalle_a_dict(reporte):
+    """Convierte una fila de obtener_reporte_detalle en el JSON compacto del modal"""
+    return {
+        'id': reporte[0],
+        'habitacion': reporte[1],
+        'camarera': reporte[3],
+        'fecha': reporte[4],
+        'hora_inicio': reporte[5],
+        'tareas': reporte[7].split(', ') if reporte[7] else [],
+        'estado': reporte[8],
+        'observaciones': reporte[9],
+        'foto': reporte[10],
+        'aprobado': reporte[11]
+    }
+
+def filtros_reportes():
+    """Lee de la query string los filtros del listado de reportes"""
+    filtros = {
+        'desde': request.args.get('desde', ''),
+        'hasta': request.args.get('hasta', ''),
+        'habitacion': request.args.get('habitacion', ''),
+        'camarera_id': request.args.get('camarera_id', 0, type=int),
+        'estado': request.args.get('estado', '')
+    }
+    return {k: v for k, v in filtros.items() if v}
+
+def leer_cursor(cursor):
+    """Convierte el cursor 'fecha|hora|id' de la URL en la clave de paginación"""
+    try:
+        fecha, hora, reporte_id = cursor.split('|')
+        return fecha, hora, int(reporte_id)
+    except (AttributeError, ValueError):
+        return None
+
+def escribir_cursor(clave):
+    return '|'.join(str(v) for v in clave) if clave else None
+
+def leer_cursor_busqueda(cursor):
+    """Convierte el cursor 'relevancia|id' de la búsqueda en su clave de paginación"""
+    try:
+        relevancia, reporte_id = cursor.split('|')
+        return float(relevancia), int(reporte_id)
+    except (AttributeError, ValueError):
+        return None
+
+# ==================== NOTIFICACIONES EN TIEMPO REAL ====================
+
+# Segundos entre latidos del stream; en cada latido se comprueba también la
+# base de datos por si otro proceso guardó reportes
+SSE_HEARTBEAT = 20
+
+# Cada stream ocupa un hilo del worker mientras está abierto. Se cierra a los
+# SSE_DURACION_MAX segundos (con algo de azar para que no reconecten todos a
+# la vez; EventSource vuelve a conectar solo con Last-Event-ID) y por encima
+# de SSE_MAX_CONEXIONES por proceso se responde 503 para dejar hilos libres
+# a las demás peticiones (ver gunicorn.conf.py).
+SSE_DURACION_MAX = int(os.environ.get('SSE_DURACION_MAX', 300))
+SSE_MAX_CONEXIONES = int(os.environ.get('SSE_MAX_CONEXIONES', 8))
+SSE_REINTENTO_MS = 5000
+
+_streams_abiertos = threading.BoundedSemaphore(SSE_MAX_CONEXIONES)
+
+_aviso_reportes = threading.Condition()
+_ultimo_reporte_id = 0
+
+def notificar_reporte(reporte_id):
+    """Despierta a los dashboards conectados tras guardar un reporte"""
+    global _ultimo_reporte_id
+    with _aviso_reportes:
+        _ultimo_reporte_id = max(_ultimo_reporte_id, reporte_id)
+        _aviso_reportes.notify_all()
+
+def esperar_reportes(desde_id, timeout):
+    """Bloquea hasta que haya un reporte con id mayor que desde_id o venza el timeout;
+    devuelve el último id notificado"""
+    with _aviso_reportes:
+        _aviso_reportes.wait_for(lambda: _ultimo_reporte_id > desde_id, timeout)
+        return _ultimo_reporte_id
+
 # ==================== RUTAS DE LOGIN ====================
 
 @app.route('/')
@@ -68,13 +291,35 @@ def logout():
 
 # ==================== RUTAS PARA CAMARERAS ====================
 
+# Último grid de habitaciones renderizado, con la versión de datos que lo generó
+_grid_habitaciones = {}
+
 @app.route('/seleccionar-habitacion')
 def seleccionar_habitacion():
+    global _grid_habitaciones
     if 'usuario_id' not in session or session['rol'] != 'camarera':
         return redirect(url_for('login'))
 
-    habitaciones = db.obtener_habitaciones()
-    return render_template('seleccionar_habitacion.html', habitaciones=habitaciones)
+    # El grid solo cambia con el catálogo o con los reportes de hoy: se reutiliza
+    # el HTML ya renderizado y, si el móvil ya lo tiene, se responde 304
+    clave = (db.version_habitaciones(), db.obtener_version_reportes_hoy())
+    fragmento = _grid_habitaciones
+    if fragmento.get('clave') != clave:
+        html = render_template('habitaciones_grid.html', habitaciones=db.obtener_estado_habitaciones_hoy())
+        fragmento = {'clave': clave, 'html': html, 'hash': hashlib.sha1(html.encode()).hexdigest()}
+        _grid_habitaciones = fragmento
+
+    etag = hashlib.sha1(
+        f"{VERSION_APP}-{fragmento['hash']}-{session['usuario_id']}-{session['nombre']}".encode()
+    ).hexdigest()
+    if request.if_none_match.contains_weak(etag):
+        respuesta = Response(status=304)
+    else:
+        respuesta = make_response(render_template('seleccionar_habitacion.html', grid=fragmento['html']))
+
+    respuesta.set_etag(etag)
+    respuesta.headers['Cache-Control'] = 'private, no-cache'
+    return respuesta
 
 @app.route('/limpiar')
 def formulario_limpieza():
@@ -85,7 +330,65 @@ def formulario_limpieza():
     if not habitacion:
         return redirect(url_for('seleccionar_habitacion'))
 
-    return render_template('formulario.html', habitacion=habitacion)
+    # Desde la cola personal se vuelve a ella al terminar
+    volver = url_for('mi_cola') if request.args.get('desde') == 'cola' else url_for('seleccionar_habitacion')
+    return render_template('formulario.html', habitacion=habitacion, tareas=db.obtener_tareas(), volver=volver)
+
+# Estados válidos de un reporte
+ESTADOS = ('Limpia y lista', 'Limpia con observaciones', 'Necesita mantenimiento')
+
+# Máximo de reportes aceptados en un único lote
+MAX_REPORTES_LOTE = 500
+
+def preparar_reporte(campos, file, camarera_id, camarera_nombre, momento=None):
+    """Valida los campos de un reporte, guarda su foto y devuelve el dict para db.guardar_reporte.
+    Sin momento se usa la hora del móvil (creado), si es creíble, o la actual."""
+    habitacion = str(campos.get('habitacion') or '').strip()
+    tareas = campos.get('tareas') or []
+    estado = campos.get('estado') or ''
+    if not habitacion:
+        raise ValueError('Falta la habitación')
+    if estado not in ESTADOS:
+        raise ValueError(f'Estado no válido: {estado}')
+    if isinstance(tareas, str) or not tareas:
+        raise ValueError('Indica al menos una tarea realizada')
+    tareas_mask = db.mascara_tareas(tareas)
+
+    momento = momento or momento_reporte(campos.get('creado') or '')
+
+    # Manejar foto si existe
+    foto_path = ''
+    if file and file.filename and allowed_file(file.filename):
+        extension = file.filename.rsplit('.', 1)[1].lower()
+        foto_path = fotos.guardar_subida(file, app.config['UPLOAD_FOLDER'], extension)
+
+    return {
+        'habitacion': habitacion,
+        'camarera_id': camarera_id,
+        'camarera_nombre': camarera_nombre,
+        'fecha': momento.strftime('%Y-%m-%d'),
+        'hora_inicio': momento.strftime('%H:%M:%S'),
+        'tareas': ', '.join(tareas),
+        'tareas_mask': tareas_mask,
+        'estado': estado,
+        'observaciones': campos.get('observaciones') or '',
+        'foto_path': foto_path,
+        'idempotencia': str(campos.get('idempotencia') or '')[:64]
+    }
+
+def reporte_guardado(reporte_id, datos):
+    """Avisa a los dashboards y encola el procesamiento de la foto de un reporte nuevo"""
+    notificar_reporte(reporte_id)
+
+    # Reescalado, EXIF y miniatura se hacen fuera de la petición
+    if datos['foto_path']:
+        fotos.procesar_en_segundo_plano(reporte_id, datos['foto_path'], app.config['UPLOAD_FOLDER'])
+
+    # Si la camarera ya terminó su cola, recibe habitaciones de quien va más cargada
+    try:
+        rebalancear_si_libre(datos['camarera_id'], datos['fecha'])
+    except Exception as e:
+        print(f"⚠️ Error al rebalancear el reparto: {e}")
 
 @app.route('/guardar-reporte', methods=['POST'])
 def guardar_reporte():
@@ -93,38 +396,17 @@ def guardar_reporte():
         return jsonify({'success': False, 'error': 'No autorizado'}), 401
 
     try:
-        # Obtener datos del formulario
         habitacion = request.form['habitacion']
-        tareas = request.form.getlist('tareas[]')
-        estado = request.form['estado']
-        observaciones = request.form.get('observaciones', '')
-
-        # Manejar foto si existe
-        foto_path = ''
-        if 'foto' in request.files:
-            file = request.files['foto']
-            if file and file.filename and allowed_file(file.filename):
-                filename = secure_filename(file.filename)
-                timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-                filename = f"{habitacion}_{timestamp}_{filename}"
-                filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-                file.save(filepath)
-                foto_path = filename
-
-        # Preparar datos para guardar
-        datos = {
-            'habitacion': habitacion,
-            'camarera_id': session['usuario_id'],
-            'camarera_nombre': session['nombre'],
-            'fecha': datetime.now().strftime('%Y-%m-%d'),
-            'hora_inicio': datetime.now().strftime('%H:%M:%S'),
-            'tareas': ', '.join(tareas),
-            'estado': estado,
-            'observaciones': observaciones,
-            'foto_path': foto_path
-        }
-
-        reporte_id = db.guardar_reporte(datos)
+
+        # Reenvío desde la cola offline de un reporte que ya llegó: no se guarda otra vez
+        reporte_id = db.buscar_reporte_por_idempotencia(request.form.get('idempotencia', '')[:64])
+        if not reporte_id:
+            campos = request.form.to_dict()
+            campos['tareas'] = request.form.getlist('tareas[]')
+            datos = preparar_reporte(campos, request.files.get('foto'),
+                                     session['usuario_id'], session['nombre'])
+            reporte_id = db.guardar_reporte(datos)
+            reporte_guardado(reporte_id, datos)
 
         return jsonify({
             'success': True,
@@ -132,9 +414,106 @@ def guardar_reporte():
             'reporte_id': reporte_id
         })
 
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+def leer_lote():
+    """Lee los reportes de un lote: NDJSON (una línea por reporte) o multipart con un campo
+    'reportes' en JSON cuyas fotos se indican por nombre de campo en 'foto'"""
+    if request.mimetype == 'application/x-ndjson':
+        return [json.loads(linea) for linea in request.get_data(as_text=True).splitlines() if linea.strip()]
+    return json.loads(request.form.get('reportes') or '[]')
+
+@app.route('/guardar-reportes-lote', methods=['POST'])
+def guardar_reportes_lote():
+    """Guarda muchos reportes en una sola transacción; devuelve un resultado por reporte"""
+    if 'usuario_id' not in session or session['rol'] not in ('camarera', 'admin'):
+        return jsonify({'success': False, 'error': 'No autorizado'}), 401
+
+    try:
+        lote = leer_lote()
+    except ValueError as e:
+        return jsonify({'success': False, 'error': f'Lote no válido: {e}'}), 400
+    if not isinstance(lote, list) or len(lote) > MAX_REPORTES_LOTE:
+        return jsonify({'success': False, 'error': f'Se esperaba una lista de hasta {MAX_REPORTES_LOTE} reportes'}), 400
+
+    # Una cola offline solo se envía con la sesión de quien la llenó; el móvil la
+    # conserva y la vuelve a intentar cuando esa persona entre (409)
+    if session['rol'] == 'camarera' and any(
+        isinstance(campos, dict) and campos.get('usuario_id') not in (None, session['usuario_id'])
+        for campos in lote
+    ):
+        return jsonify({'success': False, 'error': 'Los reportes son de otro usuario'}), 409
+
+    def clave(campos):
+        return str(campos.get('idempotencia') or '')[:64] if isinstance(campos, dict) else ''
+
+    def resultado(indice, reporte_id, duplicado, idempotencia):
+        return {'indice': indice, 'success': True, 'reporte_id': reporte_id,
+                'duplicado': duplicado, 'idempotencia': idempotencia}
+
+    # Los reenvíos de reportes ya guardados se contestan sin validarlos ni guardar otra vez su foto
+    try:
+        guardados_antes = db.buscar_reportes_por_idempotencia([clave(campos) for campos in lote])
+        camareras = {u[0]: u[1] for u in db.obtener_usuarios() if u[4] == 'camarera'}
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
+    resultados = [None] * len(lote)
+    validos = []
+    primero_con_clave = {}
+    repetidos = []
+    for indice, campos in enumerate(lote):
+        try:
+            if not isinstance(campos, dict):
+                raise ValueError('Cada reporte debe ser un objeto')
+
+            idempotencia = clave(campos)
+            if idempotencia in guardados_antes:
+                resultados[indice] = resultado(indice, guardados_antes[idempotencia], True, idempotencia)
+                continue
+            if idempotencia in primero_con_clave:
+                repetidos.append((indice, primero_con_clave[idempotencia]))
+                continue
+
+            # Las importaciones del admin indican la camarera y la fecha; una camarera solo
+            # reporta lo suyo y la hora sale de su móvil
+            if session['rol'] == 'admin':
+                camarera_id = int(campos['camarera_id'])
+                if camarera_id not in camareras:
+                    raise ValueError(f'Camarera desconocida: {camarera_id}')
+                camarera_nombre = campos.get('camarera_nombre') or camareras[camarera_id]
+                momento = momento_importado(campos)
+            else:
+                camarera_id, camarera_nombre = session['usuario_id'], session['nombre']
+                momento = None
+
+            file = request.files.get(campos.get('foto') or '')
+            validos.append((indice, preparar_reporte(campos, file, camarera_id, camarera_nombre, momento)))
+            if idempotencia:
+                primero_con_clave[idempotencia] = indice
+        except (KeyError, TypeError, ValueError) as e:
+            resultados[indice] = {'indice': indice, 'success': False, 'error': str(e)}
+
+    try:
+        guardados = db.guardar_reportes([datos for _, datos in validos])
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+    for (indice, datos), (reporte_id, nuevo) in zip(validos, guardados):
+        if nuevo:
+            reporte_guardado(reporte_id, datos)
+        resultados[indice] = resultado(indice, reporte_id, not nuevo, datos['idempotencia'])
+
+    # Un reporte repetido dentro del lote es un duplicado del primero con su clave
+    for indice, primero in repetidos:
+        resultados[indice] = resultado(indice, resultados[primero]['reporte_id'], True,
+                                       resultados[primero]['idempotencia'])
+
+    return jsonify({'success': True, 'resultados': resultados})
+
 # ==================== RUTAS PARA JEFA ====================
 
 @app.route('/dashboard')
@@ -144,18 +523,84 @@ def dashboard():
 
     estadisticas = db.obtener_estadisticas_hoy()
     reportes = db.obtener_reportes_hoy()
+    ultimo_id = max((r[0] for r in reportes), default=0)
 
     return render_template('dashboard.html',
                          estadisticas=estadisticas,
-                         reportes=reportes)
+                         reportes=reportes,
+                         ultimo_id=ultimo_id)
+
+@app.route('/api/eventos')
+def api_eventos():
+    """Stream SSE con los reportes nuevos y las estadísticas actualizadas"""
+    if 'usuario_id' not in session or session['rol'] != 'jefa':
+        return jsonify({'error': 'No autorizado'}), 401
+
+    if not _streams_abiertos.acquire(blocking=False):
+        respuesta = jsonify({'error': 'Demasiadas conexiones en tiempo real'})
+        respuesta.status_code = 503
+        respuesta.headers['Retry-After'] = str(SSE_HEARTBEAT)
+        return respuesta
+
+    # EventSource reenvía Last-Event-ID al reconectar
+    desde_id = request.headers.get('Last-Event-ID', type=int) or request.args.get('desde', 0, type=int)
+    fin = time.monotonic() + SSE_DURACION_MAX * random.uniform(0.8, 1.0)
+
+    def stream(desde_id):
+        yield f'retry: {SSE_REINTENTO_MS}\n\n'
+        while True:
+            restante = fin - time.monotonic()
+            if restante <= 0:
+                return
+            ultimo_id = esperar_reportes(desde_id, min(SSE_HEARTBEAT, restante))
+            if ultimo_id <= desde_id:
+                ultimo_id = db.obtener_ultimo_reporte_id()
+                if ultimo_id <= desde_id:
+                    yield ': ping\n\n'
+                    continue
+
+            nuevos = db.obtener_reportes_hoy(desde_id)
+            desde_id = max([ultimo_id] + [r[0] for r in nuevos])
+            if not nuevos:
+                continue
+
+            datos = {
+                'reportes': [reporte_a_dict(r) for r in nuevos],
+                'estadisticas': db.obtener_estadisticas_hoy()
+            }
+            yield f'id: {desde_id}\nevent: reportes\ndata: {json.dumps(datos)}\n\n'
+
+    respuesta = Response(stream(desde_id), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+    # Se libera al cerrar la respuesta, también si el cliente se fue antes del primer evento
+    respuesta.call_on_close(_streams_abiertos.release)
+    return respuesta
 
 @app.route('/api/reportes-hoy')
 def api_reportes_hoy():
     if 'usuario_id' not in session or session['rol'] != 'jefa':
         return jsonify({'error': 'No autorizado'}), 401
 
-    reportes = db.obtener_reportes_hoy()
-    return jsonify({'reportes': reportes})
+    desde_id = request.args.get('desde_id', 0, type=int)
+
+    # La versión (fecha, total, último id, cambios) sale de índices; si no cambió no se leen las filas
+    fecha, total, ultimo_id, cambios = db.obtener_version_reportes_hoy()
+    etag = f'{fecha}-{total}-{ultimo_id}-{cambios}-{desde_id}'
+    if request.if_none_match.contains_weak(etag):
+        respuesta = Response(status=304)
+    else:
+        reportes = db.obtener_reportes_hoy(desde_id)
+        respuesta = jsonify({
+            'reportes': [reporte_a_dict(r) for r in reportes],
+            'total': total,
+            'ultimo_id': max([ultimo_id] + [r[0] for r in reportes])
+        })
+
+    respuesta.set_etag(etag)
+    respuesta.headers['Cache-Control'] = 'private, no-cache'
+    return respuesta
 
 @app.route('/detalle-reporte/<int:reporte_id>')
 def detalle_reporte(reporte_id):
@@ -165,6 +610,196 @@ def detalle_reporte(reporte_id):
     reporte = db.obtener_reporte_detalle(reporte_id)
     return render_template('detalle_reporte.html', reporte=reporte)
 
+def respuesta_json_condicional(datos):
+    """JSON con ETag de su contenido; 304 sin cuerpo si el cliente ya lo tiene"""
+    cuerpo = json.dumps(datos, ensure_ascii=False, separators=(',', ':'), sort_keys=True)
+    etag = hashlib.md5(cuerpo.encode()).hexdigest()
+    if request.if_none_match.contains_weak(etag):
+        respuesta = Response(status=304)
+    else:
+        respuesta = Response(cuerpo, mimetype='application/json')
+    respuesta.set_etag(etag)
+    # La foto cambia de ruta cuando termina de procesarse: siempre se revalida
+    respuesta.headers['Cache-Control'] = 'private, no-cache'
+    return respuesta
+
+# Máximo de detalles por petición al precargar las filas visibles
+MAX_DETALLES_LOTE = 50
+
+@app.route('/api/reportes/<int:reporte_id>')
+def api_reporte_detalle(reporte_id):
+    if 'usuario_id' not in session or session['rol'] != 'jefa':
+        return jsonify({'error': 'No autorizado'}), 401
+
+    reporte = db.obtener_reporte_detalle(reporte_id)
+    if not reporte:
+        return jsonify({'error': 'Reporte no encontrado'}), 404
+    return respuesta_json_condicional(detalle_a_dict(reporte))
+
+@app.route('/api/reportes/detalle')
+def api_reportes_detalle():
+    """Varios detalles en una respuesta: ?ids=1,2,3"""
+    if 'usuario_id' not in session or session['rol'] != 'jefa':
+        return jsonify({'error': 'No autorizado'}), 401
+
+    try:
+        ids = sorted({int(i) for i in request.args.get('ids', '').split(',') if i})[:MAX_DETALLES_LOTE]
+    except ValueError:
+        return jsonify({'error': 'ids no válidos'}), 400
+
+    reportes = db.obtener_reportes_detalle(ids) if ids else []
+    return respuesta_json_condicional({'reportes': [detalle_a_dict(r) for r in reportes]})
+
+def resaltar(fragmento):
+    """Fragmento de búsqueda como HTML seguro, con el término encontrado en <mark>"""
+    return (str(escape(fragmento))
+            .replace(db.MARCA_INICIO, '<mark>')
+            .replace(db.MARCA_FIN, '</mark>'))
+
+@app.route('/api/buscar')
+def api_buscar():
+    """Búsqueda de texto en las observaciones: ?q=grifo&piso=2&desde=...&hasta=...&despues=<siguiente>"""
+    if 'usuario_id' not in session or session['rol'] not in ('jefa', 'admin'):
+        return jsonify({'error': 'No autorizado'}), 401
+
+    filtros = filtros_reportes()
+    filtros['piso'] = request.args.get('piso', 0, type=int)
+    resultados, siguiente = db.buscar_reportes(
+        request.args.get('q', ''), filtros, leer_cursor_busqueda(request.args.get('despues'))
+    )
+
+    return jsonify({
+        'resultados': [dict(detalle_a_dict(r), fragmento=resaltar(f)) for r, f in resultados],
+        'siguiente': escribir_cursor(siguiente),
+        'hay_mas': siguiente is not None
+    })
+
+@app.route('/api/tareas/cumplimiento')
+def api_cumplimiento_tareas():
+    """Cuántas veces se hizo y se omitió cada tarea (por defecto, los últimos 30 días)"""
+    if 'usuario_id' not in session or session['rol'] not in ('jefa', 'admin'):
+        return jsonify({'error': 'No autorizado'}), 401
+
+    filtros = filtros_reportes()
+    desde = filtros.get('desde') or (datetime.now() - timedelta(days=29)).strftime('%Y-%m-%d')
+    return jsonify(db.obtener_cumplimiento_tareas(
+        desde, filtros.get('hasta'), request.args.get('piso', 0, type=int)))
+
+# Tendencias: solo leen las tablas de KPIs, nunca reportes
+MAX_MESES_ANALITICA = 36
+
+def meses_analitica():
+    return min(max(request.args.get('meses', 12, type=int), 1), MAX_MESES_ANALITICA)
+
+@app.route('/analitica')
+def analitica():
+    if 'usuario_id' not in session or session['rol'] not in ('jefa', 'admin'):
+        return redirect(url_for('login'))
+
+    meses = meses_analitica()
+    return render_template('analitica.html', kpis=db.obtener_kpis(meses), meses=meses)
+
+@app.route('/api/analitica')
+def api_analitica():
+    if 'usuario_id' not in session or session['rol'] not in ('jefa', 'admin'):
+        return jsonify({'error': 'No autorizado'}), 401
+
+    return jsonify(db.obtener_kpis(meses_analitica()))
+
+# ==================== REPARTO DE HABITACIONES ====================
+
+def fecha_hoy():
+    return datetime.now().strftime('%Y-%m-%d')
+
+def generar_reparto(fecha, camareras=None, forzar=False):
+    """Reparte las habitaciones pendientes del día entre las camareras indicadas (por
+    defecto, todas las activas). Sin forzar no toca un plan que ya exista."""
+    habitaciones = db.obtener_habitaciones()
+    camareras = camareras or [c[0] for c in db.obtener_camareras_activas()]
+    minutos = asignaciones.estimar_minutos(habitaciones, db.obtener_duraciones_limpieza())
+
+    def planificar(filas, hechas):
+        if filas and not forzar:
+            return None
+        return asignaciones.repartir(habitaciones, camareras, minutos, hechas)
+
+    return db.replanificar_asignaciones(fecha, planificar)
+
+def rebalancear_reparto(fecha, siempre=False):
+    pisos = {numero: piso for numero, piso, _ in db.obtener_habitaciones()}
+    return db.replanificar_asignaciones(
+        fecha, lambda filas, hechas: asignaciones.rebalancear(filas, hechas, pisos, siempre))
+
+def rebalancear_si_libre(camarera_id, fecha):
+    """Tras un reporte: si la camarera no tiene nada pendiente hoy, se reequilibra el plan"""
+    if fecha == fecha_hoy() and db.contar_pendientes(fecha, camarera_id) == 0:
+        rebalancear_reparto(fecha)
+
+def reparto_de_hoy(camarera_id=None):
+    """Asignaciones de hoy (de una camarera o de todas), generando el plan la primera vez"""
+    fecha = fecha_hoy()
+    filas = db.obtener_asignaciones(fecha, camarera_id)
+    if not filas:
+        generar_reparto(fecha)
+        filas = db.obtener_asignaciones(fecha, camarera_id)
+    return fecha, filas
+
+def respuesta_reparto():
+    fecha, filas = reparto_de_hoy()
+    return jsonify({'fecha': fecha, 'camareras': asignaciones.agrupar(filas, db.obtener_camareras_activas())})
+
+@app.route('/mi-cola')
+def mi_cola():
+    """Habitaciones asignadas hoy a la camarera, en el orden en que le toca hacerlas"""
+    if 'usuario_id' not in session or session['rol'] != 'camarera':
+        return redirect(url_for('login', next=request.url))
+
+    _, filas = reparto_de_hoy(session['usuario_id'])
+    return render_template('mi_cola.html', habitaciones=filas,
+                           pendientes=[f for f in filas if not f[7]],
+                           hechas=[f for f in filas if f[7]])
+
+@app.route('/api/asignaciones')
+def api_asignaciones():
+    if 'usuario_id' not in session or session['rol'] not in ('jefa', 'admin'):
+        return jsonify({'error': 'No autorizado'}), 401
+    return respuesta_reparto()
+
+@app.route('/api/asignaciones/generar', methods=['POST'])
+def api_generar_asignaciones():
+    """Vuelve a repartir lo pendiente; 'camareras' limita el reparto a esas ids (p. ej. ausencias)"""
+    if 'usuario_id' not in session or session['rol'] not in ('jefa', 'admin'):
+        return jsonify({'error': 'No autorizado'}), 401
+
+    activas = {c[0] for c in db.obtener_camareras_activas()}
+    camareras = [c for c in request.form.getlist('camareras', type=int) if c in activas]
+    generar_reparto(fecha_hoy(), sorted(camareras) or None, forzar=True)
+    return respuesta_reparto()
+
+@app.route('/api/asignaciones/rebalancear', methods=['POST'])
+def api_rebalancear_asignaciones():
+    if 'usuario_id' not in session or session['rol'] not in ('jefa', 'admin'):
+        return jsonify({'error': 'No autorizado'}), 401
+
+    rebalancear_reparto(fecha_hoy(), siempre=True)
+    return respuesta_reparto()
+
+@app.route('/api/asignaciones/mover', methods=['POST'])
+def api_mover_asignacion():
+    if 'usuario_id' not in session or session['rol'] not in ('jefa', 'admin'):
+        return jsonify({'error': 'No autorizado'}), 401
+
+    habitacion = request.form.get('habitacion', '').strip()
+    camarera_id = request.form.get('camarera_id', 0, type=int)
+    if habitacion not in {h[0] for h in db.obtener_habitaciones()}:
+        return jsonify({'error': f'Habitación desconocida: {habitacion}'}), 400
+    if camarera_id not in {c[0] for c in db.obtener_camareras_activas()}:
+        return jsonify({'error': 'Camarera no válida'}), 400
+
+    db.replanificar_asignaciones(
+        fecha_hoy(), lambda filas, hechas: asignaciones.mover(filas, habitacion, camarera_id))
+    return respuesta_reparto()
+
 # ==================== RUTAS PARA ADMIN ====================
 
 @app.route('/admin')
@@ -174,11 +809,43 @@ def admin_panel():
 
     usuarios = db.obtener_usuarios()
     habitaciones = db.obtener_todas_habitaciones()
-    reportes = db.obtener_todos_reportes()
+    tareas = db.obtener_todas_tareas()
+    filtros = filtros_reportes()
+    reportes, siguiente = db.obtener_reportes_paginados(filtros, leer_cursor(request.args.get('despues')))
     return render_template('admin.html',
                          usuarios=usuarios,
                          habitaciones=habitaciones,
-                         reportes=reportes)
+                         tareas=tareas,
+                         reportes=reportes,
+                         filtros=filtros,
+                         siguiente=escribir_cursor(siguiente),
+                         estados=ESTADOS,
+                         es_hash=db.es_hash,
+                         tab_reportes='tab' in request.args or bool(filtros) or 'despues' in request.args)
+
+@app.route('/admin/api/reportes')
+def admin_api_reportes():
+    if 'usuario_id' not in session or session['rol'] != 'admin':
+        return jsonify({'error': 'No autorizado'}), 401
+
+    reportes, siguiente = db.obtener_reportes_paginados(
+        filtros_reportes(),
+        leer_cursor(request.args.get('despues')),
+        max(1, min(request.args.get('limite', db.REPORTES_POR_PAGINA, type=int), 500))
+    )
+    return jsonify({
+        'reportes': [{
+            'id': r[0],
+            'habitacion': r[1],
+            'camarera': r[2],
+            'fecha': r[3],
+            'hora_inicio': r[4],
+            'estado': r[5],
+            'observaciones': r[6],
+            'foto': r[7]
+        } for r in reportes],
+        'siguiente': escribir_cursor(siguiente)
+    })
 
 @app.route('/admin/usuarios/crear', methods=['POST'])
 def admin_crear_usuario():
@@ -248,27 +915,124 @@ def admin_eliminar_habitacion(id):
     db.eliminar_habitacion(id)
     return redirect(url_for('admin_panel'))
 
+@app.route('/admin/tareas/crear', methods=['POST'])
+def admin_crear_tarea():
+    if 'usuario_id' not in session or session['rol'] != 'admin':
+        return jsonify({'error': 'No autorizado'}), 401
+    try:
+        db.crear_tarea(request.form['nombre'])
+        return redirect(url_for('admin_panel'))
+    except Exception as e:
+        return redirect(url_for('admin_panel', error=str(e)))
+
+@app.route('/admin/tareas/<int:bit>/activa', methods=['POST'])
+def admin_activar_tarea(bit):
+    if 'usuario_id' not in session or session['rol'] != 'admin':
+        return jsonify({'error': 'No autorizado'}), 401
+    db.activar_tarea(bit, request.form.get('activa') == '1')
+    return redirect(url_for('admin_panel'))
+
 @app.route('/admin/reportes/eliminar/<int:id>', methods=['POST'])
 def admin_eliminar_reporte(id):
     if 'usuario_id' not in session or session['rol'] != 'admin':
         return jsonify({'error': 'No autorizado'}), 401
-    db.eliminar_reporte(id)
+    fotos.borrar(app.config['UPLOAD_FOLDER'], db.eliminar_reporte(id))
     return redirect(url_for('admin_panel'))
 
+@app.route('/admin/exportar')
+def exportar_reportes():
+    """Descarga los reportes filtrados en CSV, XLSX o ZIP con fotos, generada por trozos"""
+    if 'usuario_id' not in session or session['rol'] != 'admin':
+        return redirect(url_for('login'))
+
+    formato = request.args.get('formato', 'csv')
+    incluir_fotos = request.args.get('fotos', '')
+    reportes = db.iterar_reportes(filtros_reportes())
+    nombre = f"reportes_{datetime.now().strftime('%Y%m%d_%H%M')}"
+
+    if incluir_fotos == 'zip':
+        cuerpo = exportar.zip_stream(reportes, app.config['UPLOAD_FOLDER'])
+        nombre, mimetype = f'{nombre}.zip', 'application/zip'
+    else:
+        columna_foto = None
+        if incluir_fotos == 'enlaces':
+            base = url_for('uploaded_file', filename='', _external=True)
+            columna_foto = lambda ruta: base + ruta
+        filas = exportar.filas(reportes, columna_foto)
+
+        if formato == 'xlsx':
+            cuerpo = exportar.xlsx_stream(filas)
+            nombre = f'{nombre}.xlsx'
+            mimetype = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+        else:
+            cuerpo = exportar.csv_stream(filas)
+            nombre, mimetype = f'{nombre}.csv', 'text/csv; charset=utf-8'
+
+    respuesta = Response(cuerpo, mimetype=mimetype)
+    respuesta.headers['Content-Disposition'] = f'attachment; filename="{nombre}"'
+    respuesta.headers['Cache-Control'] = 'no-store'
+    return respuesta
+
 # ==================== SERVIR ARCHIVOS ESTÁTICOS ====================
 
-from flask import send_from_directory
+from flask import send_from_directory, abort
+from werkzeug.security import safe_join
 
-@app.route('/uploads/<filename>')
+# Los nombres de archivo de /uploads nunca se reutilizan, así que se pueden cachear para siempre
+CACHE_UPLOADS = 365 * 24 * 3600
+
+def enviar_upload(filename):
+    """Envía un archivo de uploads con ETag fuerte, soporte de Range y caché inmutable"""
+    respuesta = send_from_directory(app.config['UPLOAD_FOLDER'], filename,
+                                    conditional=True, etag=True, max_age=CACHE_UPLOADS)
+    respuesta.cache_control.public = True
+    respuesta.cache_control.immutable = True
+    return respuesta
+
+@app.route('/sw.js')
+def service_worker():
+    # Servido desde la raíz para que su alcance cubra toda la aplicación
+    respuesta = send_from_directory('static/js', 'sw.js', max_age=0)
+    respuesta.headers['Cache-Control'] = 'no-cache'
+    return respuesta
+
+@app.route('/uploads/<path:filename>')
 def uploaded_file(filename):
-    return send_from_directory(app.config['UPLOAD_FOLDER'], filename)
+    return enviar_upload(filename)
+
+@app.route('/miniaturas/<int:lado>/<path:filename>')
+def miniatura(lado, filename):
+    if lado not in fotos.TAMANOS_VARIANTE:
+        abort(404)
+    ruta = safe_join(app.config['UPLOAD_FOLDER'], filename)
+    if ruta is None or not os.path.isfile(ruta):
+        abort(404)
+    return enviar_upload(fotos.obtener_variante(app.config['UPLOAD_FOLDER'], filename, lado))
+
+# ==================== MÉTRICAS ====================
+
+# /metrics es privado: lo ve el admin con su sesión y, si se define METRICAS_TOKEN,
+# quien mande "Authorization: Bearer <token>" (Prometheus)
+METRICAS_TOKEN = os.environ.get('METRICAS_TOKEN')
+
+@app.route('/metrics')
+def metrics():
+    token = request.headers.get('Authorization', '')
+    con_token = bool(METRICAS_TOKEN) and hmac.compare_digest(token.encode(), f'Bearer {METRICAS_TOKEN}'.encode())
+    if not con_token and session.get('rol') != 'admin':
+        abort(401)
+    # Suma las métricas de todos los workers de gunicorn (ver metricas.METRICAS_DIR)
+    return Response(metricas.exponer(), mimetype='text/plain; version=0.0.4')
 
 # ==================== INICIAR SERVIDOR ====================
+#
+# Producción: gunicorn -c gunicorn.conf.py wsgi:app   (Linux, varios procesos)
+#             python app.py                           (waitress, si está instalado)
+# Desarrollo: python app.py --dev                     (servidor de Flask con recarga)
 
-if __name__ == '__main__':
-    # Inicializar base de datos
-    db.init_db()
+PUERTO = int(os.environ.get('PUERTO', 3000))
 
+def mostrar_banner():
     # Obtener IP local
     import socket
     hostname = socket.gethostname()
@@ -277,13 +1041,29 @@ if __name__ == '__main__':
     print("\n" + "="*50)
     print("🏨 SERVIDOR DE LIMPIEZA DE HOTEL")
     print("="*50)
-    print(f"📱 Acceso desde celulares: http://{local_ip}:3000")
-    print(f"💻 Acceso local: http://localhost:3000")
+    print(f"📱 Acceso desde celulares: http://{local_ip}:{PUERTO}")
+    print(f"💻 Acceso local: http://localhost:{PUERTO}")
     print("="*50)
     print("\n👥 USUARIOS DE PRUEBA:")
     print("   Jefa: usuario=jefa, password=123456")
     print("   Camareras: usuario=maria/ana/carmen, password=1234")
     print("="*50 + "\n")
 
-    # Iniciar servidor
-    app.run(host='0.0.0.0', port=3000, debug=True)
+if __name__ == '__main__':
+    import sys
+
+    # Inicializar base de datos
+    db.init_db()
+
+    try:
+        from waitress import serve
+    except ImportError:
+        serve = None
+
+    if '--dev' in sys.argv or serve is None:
+        mostrar_banner()
+        app.run(host='0.0.0.0', port=PUERTO, debug='--dev' in sys.argv, threaded=True)
+    else:
+        print(f"🏨 Servidor de producción en http://0.0.0.0:{PUERTO}")
+        serve(app, host='0.0.0.0', port=PUERTO, threads=16, channel_timeout=120)
+        fotos.terminar()
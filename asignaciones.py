@@ -0,0 +1,159 @@
+"""Reparto diario de habitaciones entre las camareras.
+
+Las funciones de este módulo no tocan la base de datos: reciben las
+asignaciones del día como filas (habitacion, camarera_id, orden, minutos) y
+devuelven las nuevas. repositorio.replanificar_asignaciones las ejecuta dentro
+de una transacción de escritura.
+"""
+
+# Minutos por habitación cuando no hay historial de su tipo
+MINUTOS_POR_DEFECTO = 25
+
+# Reportes que necesita una habitación para usar su propio promedio en vez del de su tipo
+MIN_MUESTRAS = 5
+
+def _clave_habitacion(habitacion):
+    """Orden de recorrido: por piso y, dentro del piso, por número ('109' antes que '110')"""
+    numero, piso = habitacion[0], habitacion[1]
+    return piso, len(numero), numero
+
+# ==================== ESTIMACIÓN ====================
+
+def estimar_minutos(habitaciones, duraciones):
+    """Minutos estimados por habitación a partir de repositorio.obtener_duraciones_limpieza()"""
+    por_habitacion = {numero: (muestras, promedio) for numero, _, muestras, promedio in duraciones}
+
+    # Promedio por tipo, ponderado por las muestras de cada habitación
+    suma_tipo, muestras_tipo = {}, {}
+    for _, tipo, muestras, promedio in duraciones:
+        suma_tipo[tipo] = suma_tipo.get(tipo, 0) + muestras * promedio
+        muestras_tipo[tipo] = muestras_tipo.get(tipo, 0) + muestras
+
+    minutos = {}
+    for numero, _, tipo in habitaciones:
+        muestras, promedio = por_habitacion.get(numero, (0, 0))
+        if muestras >= MIN_MUESTRAS:
+            minutos[numero] = round(promedio, 1)
+        elif muestras_tipo.get(tipo):
+            minutos[numero] = round(suma_tipo[tipo] / muestras_tipo[tipo], 1)
+        else:
+            minutos[numero] = MINUTOS_POR_DEFECTO
+    return minutos
+
+# ==================== REPARTO ====================
+
+def _numerar(colas, minutos):
+    """Filas (habitacion, camarera_id, orden, minutos) a partir de las colas de cada camarera"""
+    return [(numero, camarera_id, orden, minutos.get(numero, MINUTOS_POR_DEFECTO))
+            for camarera_id, cola in colas.items()
+            for orden, numero in enumerate(cola)]
+
+def repartir(habitaciones, camareras, minutos, hechas=None):
+    """Plan del día: las habitaciones pendientes, en orden de piso, se cortan en tramos
+    consecutivos de minutos parecidos, uno por camarera, para que cada una trabaje en
+    el menor número de pisos posible. Las ya hechas se quedan con quien las hizo, al
+    principio de su cola; las de quien no entra en el reparto (una ausencia) salen del
+    plan, porque rebalancear la vería sin pendientes y le pasaría habitaciones.
+
+    habitaciones: [(numero, piso, tipo)]; camareras: [id]; hechas: {numero: camarera_id}.
+    """
+    hechas = hechas or {}
+    colas = {camarera_id: [] for camarera_id in camareras}
+    for numero, camarera_id in hechas.items():
+        if camarera_id in colas:
+            colas[camarera_id].append(numero)
+    if not camareras:
+        return _numerar(colas, minutos)
+
+    pendientes = sorted((h for h in habitaciones if h[0] not in hechas), key=_clave_habitacion)
+    objetivo = sum(minutos[h[0]] for h in pendientes) / len(camareras)
+    acumulado = 0
+    for habitacion in pendientes:
+        duracion = minutos[habitacion[0]]
+        # Cada habitación va al tramo en el que cae su punto medio
+        tramo = min(int((acumulado + duracion / 2) / objetivo), len(camareras) - 1) if objetivo else 0
+        colas[camareras[tramo]].append(habitacion[0])
+        acumulado += duracion
+    return _numerar(colas, minutos)
+
+def rebalancear(filas, hechas, pisos, siempre=False):
+    """Si alguna camarera ya no tiene habitaciones pendientes (o siempre), le pasa
+    habitaciones de las que más minutos tienen por delante hasta igualar la carga. Solo se
+    mueven habitaciones pendientes y nunca la siguiente de cada cola (puede estar
+    limpiándola). Devuelve None si no hay nada que mover.
+
+    filas: asignaciones actuales; hechas: {numero: camarera_id}; pisos: {numero: piso}.
+    """
+    minutos = {numero: m for numero, _, _, m in filas}
+    colas = {}
+    for numero, camarera_id, _, _ in sorted(filas, key=lambda f: f[2]):
+        colas.setdefault(camarera_id, []).append(numero)
+
+    pendientes = {c: [n for n in cola if n not in hechas] for c, cola in colas.items()}
+    restantes = {c: sum(minutos[n] for n in cola) for c, cola in pendientes.items()}
+    if not restantes or (min(restantes.values()) > 0 and not siempre):
+        return None
+
+    movidas = 0
+    for _ in range(len(filas)):
+        libre = min(restantes, key=restantes.get)
+        cargada = max(restantes, key=restantes.get)
+        candidatas = pendientes[cargada][1:]
+
+        # La más cercana al piso donde está la que recibe y, a igualdad, la más del final
+        cola_libre = pendientes[libre] or colas[libre]
+        piso_actual = pisos.get(cola_libre[-1], 0) if cola_libre else 0
+        candidatas = [n for n in candidatas if restantes[libre] + minutos[n] < restantes[cargada]]
+        if not candidatas:
+            break
+        numero = min(reversed(candidatas), key=lambda n: abs(pisos.get(n, 0) - piso_actual))
+
+        pendientes[cargada].remove(numero)
+        colas[cargada].remove(numero)
+        pendientes[libre].append(numero)
+        colas[libre].append(numero)
+        restantes[cargada] -= minutos[numero]
+        restantes[libre] += minutos[numero]
+        movidas += 1
+
+    if not movidas:
+        return None
+
+    for camarera_id, cola in colas.items():
+        # Lo hecho primero, lo pendiente en orden de recorrido
+        cola.sort(key=lambda n: (n not in hechas, pisos.get(n, 0), len(n), n))
+    return _numerar(colas, minutos)
+
+def mover(filas, numero, camarera_id):
+    """Pasa una habitación a otra camarera, al final de su cola"""
+    nuevas = [f for f in filas if f[0] != numero]
+    minutos = next((f[3] for f in filas if f[0] == numero), MINUTOS_POR_DEFECTO)
+    orden = max((f[2] for f in nuevas if f[1] == camarera_id), default=-1) + 1
+    return nuevas + [(numero, camarera_id, orden, minutos)]
+
+# ==================== RESUMEN ====================
+
+def agrupar(asignaciones, camareras):
+    """Plan por camarera para la API y las vistas.
+
+    asignaciones: filas de repositorio.obtener_asignaciones(); camareras: [(id, nombre)].
+    """
+    plan = {camarera_id: {'camarera_id': camarera_id, 'nombre': nombre, 'habitaciones': [],
+                          'hechas': 0, 'minutos_total': 0, 'minutos_pendientes': 0}
+            for camarera_id, nombre in camareras}
+    for numero, piso, tipo, camarera_id, nombre, _, minutos, hecha in asignaciones:
+        cola = plan.setdefault(camarera_id, {
+            'camarera_id': camarera_id, 'nombre': nombre, 'habitaciones': [],
+            'hechas': 0, 'minutos_total': 0, 'minutos_pendientes': 0})
+        cola['habitaciones'].append(
+            {'numero': numero, 'piso': piso, 'tipo': tipo, 'minutos': minutos, 'hecha': bool(hecha)})
+        cola['minutos_total'] += minutos
+        if hecha:
+            cola['hechas'] += 1
+        else:
+            cola['minutos_pendientes'] += minutos
+
+    for cola in plan.values():
+        cola['minutos_total'] = round(cola['minutos_total'])
+        cola['minutos_pendientes'] = round(cola['minutos_pendientes'])
+    return sorted(plan.values(), key=lambda c: c['nombre'] or '')
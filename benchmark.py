@@ -0,0 +1,395 @@
+"""Benchmark y prueba de carga de las rutas principales.
+
+Siembra una base de datos sintética (miles de habitaciones, años de reportes)
+y mide /login, /guardar-reporte (con y sin foto), /dashboard,
+/api/reportes-hoy, /admin, /analitica, /api/buscar y /api/asignaciones, con el
+cliente de pruebas de Flask y con un generador de carga HTTP concurrente
+contra un servidor local.
+
+    python benchmark.py                                  # ambos modos
+    python benchmark.py --guardar-baseline base.json     # fija la referencia
+    python benchmark.py --comparar base.json             # falla (exit 1) si empeora
+    python benchmark.py --modo http --url http://localhost:3000   # servidor externo
+"""
+import os
+import io
+import sys
+import json
+import uuid
+import time
+import random
+import argparse
+import tempfile
+import threading
+import http.client
+from urllib.parse import urlsplit, urlencode
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+
+# El benchmark siembra y mide una base SQLite: la app no debe elegir otro backend
+os.environ.pop('DATABASE_URL', None)
+
+import repositorio as db
+import database
+
+CREDENCIALES = {
+    'camarera': ('maria', '1234'),
+    'jefa': ('jefa', '123456'),
+    'admin': ('admin', 'admin123'),
+}
+
+HABITACIONES_POR_PISO = 50
+CAMARERAS_SINTETICAS = 40
+TAREAS = list(db.TAREAS_INICIALES)
+OBSERVACIONES = ['', '', '', 'Mancha en la alfombra', 'Falta una toalla',
+                 'Grifo gotea', 'Cliente pidió más almohadas', 'Bombilla fundida']
+
+# ==================== DATOS SINTÉTICOS ====================
+
+def sembrar(habitaciones, dias, reportes_dia, semilla=1):
+    """Llena la base de datos actual (database.DB_NAME) con habitaciones, camareras y reportes"""
+    from app import ESTADOS
+
+    rnd = random.Random(semilla)
+    db.init_db()
+
+    pisos = max(1, -(-habitaciones // HABITACIONES_POR_PISO))
+    filas_hab = [(f'{piso}{num:02d}', piso, 'Doble' if num % 2 == 0 else 'Sencilla')
+                 for piso in range(1, pisos + 1)
+                 for num in range(1, HABITACIONES_POR_PISO + 1)][:habitaciones]
+
+    # Todas las camareras sintéticas comparten contraseña: basta con un hash
+    hash_comun = db.hashear_password('1234')
+    filas_usuarios = [(f'Camarera {i}', f'camarera{i}', hash_comun, 'camarera')
+                      for i in range(1, CAMARERAS_SINTETICAS + 1)]
+
+    with db.conexion(escritura=True) as conn:
+        conn.executemany(
+            'INSERT INTO habitaciones (numero, piso, tipo) VALUES (?, ?, ?) ON CONFLICT DO NOTHING', filas_hab)
+        conn.executemany(
+            'INSERT INTO usuarios (nombre, usuario, password, rol) VALUES (?, ?, ?, ?) ON CONFLICT DO NOTHING',
+            filas_usuarios)
+        numeros = [fila[0] for fila in conn.execute('SELECT numero FROM habitaciones')]
+        camareras = conn.execute("SELECT id, nombre FROM usuarios WHERE rol = 'camarera'").fetchall()
+
+    hoy = datetime.now().date()
+    total = 0
+    for dia in range(dias, -1, -1):
+        fecha = (hoy - timedelta(days=dia)).isoformat()
+        filas = []
+        for _ in range(reportes_dia):
+            camarera_id, camarera_nombre = rnd.choice(camareras)
+            segundos = rnd.randrange(8 * 3600, 16 * 3600)
+            tareas = rnd.sample(range(len(TAREAS)), rnd.randint(1, 4))
+            filas.append((
+                rnd.choice(numeros), camarera_id, camarera_nombre, fecha,
+                f'{segundos // 3600:02d}:{segundos // 60 % 60:02d}:{segundos % 60:02d}',
+                ', '.join(TAREAS[i] for i in tareas), sum(1 << i for i in tareas),
+                rnd.choice(ESTADOS), rnd.choice(OBSERVACIONES), '', rnd.random() < 0.8
+            ))
+        with db.conexion(escritura=True) as conn:
+            conn.executemany('''
+                INSERT INTO reportes
+                (habitacion_numero, camarera_id, camarera_nombre, fecha, hora_inicio,
+                 tareas_realizadas, tareas_mask, estado, observaciones, foto_path, aprobado)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', filas)
+        total += len(filas)
+
+    # Las filas se insertaron a mano, sin pasar por guardar_reporte
+    db.reconstruir_kpis()
+    with db.conexion() as conn:
+        conn.execute('ANALYZE')
+    db.invalidar_cache_habitaciones()
+    print(f"🌱 Sembrados {len(filas_hab)} habitaciones, {len(filas_usuarios)} camareras "
+          f"y {total} reportes ({dias} días)")
+
+def preparar_db(ruta, args):
+    """Apunta repositorio.py a la base de benchmark, sembrándola si hace falta"""
+    db.cargar(f'sqlite:///{ruta}')
+    if args.resembrar and os.path.exists(ruta):
+        # También el archivo de reportes antiguos: sus ids chocarían con los nuevos
+        for base in (ruta, database.ruta_archivo()):
+            for sufijo in ('', '-wal', '-shm'):
+                if os.path.exists(base + sufijo):
+                    os.remove(base + sufijo)
+
+    db.init_db()
+    with db.conexion() as conn:
+        sembrada = conn.execute('SELECT COUNT(*) FROM reportes').fetchone()[0] > 0
+    if not sembrada:
+        sembrar(args.habitaciones, args.dias, args.reportes_dia)
+
+def foto_jpeg():
+    """Una foto de móvil típica (ruido, ~1-2 MB); None si no está Pillow"""
+    try:
+        from PIL import Image
+    except ImportError:
+        return None
+    salida = io.BytesIO()
+    Image.effect_noise((2000, 1500), 40).convert('RGB').save(salida, 'JPEG', quality=90)
+    return salida.getvalue()
+
+# ==================== ESCENARIOS ====================
+#
+# Cada escenario: (nombre, rol con el que se inicia sesión, función que devuelve
+# (método, ruta, campos, archivos)). Los campos son una lista de pares.
+
+def _reporte(foto=None):
+    def peticion(rnd, habitaciones):
+        campos = [('habitacion', rnd.choice(habitaciones)),
+                  ('estado', 'Limpia y lista'),
+                  ('observaciones', rnd.choice(OBSERVACIONES)),
+                  ('idempotencia', uuid.uuid4().hex)]
+        campos += [('tareas[]', t) for t in rnd.sample(TAREAS, 3)]
+        archivos = [('foto', 'foto.jpg', foto)] if foto else []
+        return 'POST', '/guardar-reporte', campos, archivos
+    return peticion
+
+def escenarios(foto):
+    lista = [
+        ('login', None, lambda rnd, habs: ('POST', '/login', list(zip(('usuario', 'password'), CREDENCIALES['camarera'])), [])),
+        ('guardar_reporte', 'camarera', _reporte()),
+        ('guardar_reporte_foto', 'camarera', _reporte(foto)),
+        ('dashboard', 'jefa', lambda rnd, habs: ('GET', '/dashboard', [], [])),
+        ('api_reportes_hoy', 'jefa', lambda rnd, habs: ('GET', '/api/reportes-hoy', [], [])),
+        ('admin', 'admin', lambda rnd, habs: ('GET', '/admin?tab=reportes', [], [])),
+        ('analitica', 'jefa', lambda rnd, habs: ('GET', '/analitica', [], [])),
+        ('asignaciones', 'jefa', lambda rnd, habs: ('GET', '/api/asignaciones', [], [])),
+        ('buscar', 'jefa', lambda rnd, habs: ('GET', '/api/buscar?q=' + rnd.choice(('grifo', 'toalla', 'bombilla')), [], [])),
+    ]
+    if foto is None:
+        print("⚠️ Pillow no está instalado: se omite guardar_reporte_foto")
+        lista = [e for e in lista if e[0] != 'guardar_reporte_foto']
+    return lista
+
+def _multipart(campos, archivos):
+    limite = uuid.uuid4().hex
+    partes = []
+    for nombre, valor in campos:
+        partes.append(f'--{limite}\r\nContent-Disposition: form-data; name="{nombre}"\r\n\r\n{valor}\r\n'.encode())
+    for nombre, archivo, contenido in archivos:
+        partes.append(f'--{limite}\r\nContent-Disposition: form-data; name="{nombre}"; filename="{archivo}"\r\n'
+                      f'Content-Type: image/jpeg\r\n\r\n'.encode() + contenido + b'\r\n')
+    partes.append(f'--{limite}--\r\n'.encode())
+    return b''.join(partes), f'multipart/form-data; boundary={limite}'
+
+def resumen(latencias, duracion, errores):
+    latencias = sorted(latencias)
+    n = len(latencias)
+    percentil = lambda p: latencias[min(n - 1, int(p * n))] * 1000 if n else 0.0
+    return {
+        'peticiones': n,
+        'errores': errores,
+        'p50_ms': round(percentil(0.50), 2),
+        'p99_ms': round(percentil(0.99), 2),
+        'rps': round(n / duracion, 1) if duracion else 0.0,
+    }
+
+# ==================== MODO CLIENTE (Flask test client) ====================
+
+def medir_cliente(app, lista, habitaciones, peticiones):
+    """Peticiones secuenciales en el mismo proceso: coste de servicio sin red"""
+    resultados = {}
+    rnd = random.Random(2)
+    for nombre, rol, construir in lista:
+        cliente = app.test_client()
+        if rol:
+            usuario, password = CREDENCIALES[rol]
+            cliente.post('/login', data={'usuario': usuario, 'password': password})
+
+        latencias, errores = [], 0
+        inicio = time.perf_counter()
+        for _ in range(peticiones):
+            metodo, ruta, campos, archivos = construir(rnd, habitaciones)
+            datos = {}
+            for clave, valor in campos:
+                datos.setdefault(clave, []).append(valor)
+            for clave, archivo, contenido in archivos:
+                datos[clave] = (io.BytesIO(contenido), archivo)
+
+            t = time.perf_counter()
+            respuesta = cliente.open(ruta, method=metodo, data=datos,
+                                     content_type='multipart/form-data' if archivos else None)
+            respuesta.get_data()
+            latencias.append(time.perf_counter() - t)
+            errores += respuesta.status_code >= 400
+        resultados[nombre] = resumen(latencias, time.perf_counter() - inicio, errores)
+    return resultados
+
+# ==================== MODO HTTP (carga concurrente) ====================
+
+class ClienteHTTP:
+    """Conexión keep-alive con su propia cookie de sesión (una por hilo)"""
+
+    def __init__(self, url):
+        partes = urlsplit(url)
+        self.host, self.puerto = partes.hostname, partes.port or 80
+        self.cookie = None
+        self.conn = None
+
+    def pedir(self, metodo, ruta, campos=(), archivos=()):
+        cabeceras = {'Accept-Encoding': 'gzip'}
+        cuerpo = None
+        if archivos:
+            cuerpo, cabeceras['Content-Type'] = _multipart(campos, archivos)
+        elif metodo == 'POST':
+            cuerpo = urlencode(campos).encode()
+            cabeceras['Content-Type'] = 'application/x-www-form-urlencoded'
+        if self.cookie:
+            cabeceras['Cookie'] = self.cookie
+
+        for intento in range(2):
+            if self.conn is None:
+                self.conn = http.client.HTTPConnection(self.host, self.puerto, timeout=60)
+            try:
+                self.conn.request(metodo, ruta, body=cuerpo, headers=cabeceras)
+                respuesta = self.conn.getresponse()
+                respuesta.read()
+                break
+            except (http.client.HTTPException, ConnectionError):
+                # El servidor cerró la conexión keep-alive: se reintenta una vez
+                self.conn.close()
+                self.conn = None
+                if intento:
+                    raise
+
+        cookie = respuesta.getheader('Set-Cookie')
+        if cookie:
+            self.cookie = cookie.split(';', 1)[0]
+        return respuesta.status
+
+def medir_http(url, lista, habitaciones, peticiones, concurrencia):
+    """Reparte las peticiones de cada escenario entre `concurrencia` hilos"""
+    resultados = {}
+    for nombre, rol, construir in lista:
+        clientes = [ClienteHTTP(url) for _ in range(concurrencia)]
+        if rol:
+            usuario, password = CREDENCIALES[rol]
+            for cliente in clientes:
+                cliente.pedir('POST', '/login', [('usuario', usuario), ('password', password)])
+
+        latencias, errores = [], [0]
+        lock = threading.Lock()
+
+        def trabajador(indice):
+            rnd = random.Random(indice)
+            cliente = clientes[indice]
+            propias, fallos = [], 0
+            for _ in range(indice, peticiones, concurrencia):
+                metodo, ruta, campos, archivos = construir(rnd, habitaciones)
+                t = time.perf_counter()
+                try:
+                    fallos += cliente.pedir(metodo, ruta, campos, archivos) >= 400
+                except OSError:
+                    fallos += 1
+                propias.append(time.perf_counter() - t)
+            with lock:
+                latencias.extend(propias)
+                errores[0] += fallos
+
+        inicio = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrencia) as pool:
+            list(pool.map(trabajador, range(concurrencia)))
+        resultados[nombre] = resumen(latencias, time.perf_counter() - inicio, errores[0])
+    return resultados
+
+def servidor_local(app):
+    """Arranca la app en un hilo (waitress si está instalado) y devuelve su URL"""
+    try:
+        from waitress.server import create_server
+        servidor = create_server(app, host='127.0.0.1', port=0, threads=16)
+        puerto = servidor.effective_port
+        threading.Thread(target=servidor.run, daemon=True).start()
+    except ImportError:
+        import logging
+        from werkzeug.serving import make_server
+        logging.getLogger('werkzeug').setLevel(logging.WARNING)
+        servidor = make_server('127.0.0.1', 0, app, threaded=True)
+        puerto = servidor.server_port
+        threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    return f'http://127.0.0.1:{puerto}'
+
+# ==================== BASELINES ====================
+
+def comparar(resultados, baseline, tolerancia):
+    """Lista las regresiones respecto a la baseline (p99 más alto o menos rps)"""
+    regresiones = []
+    for modo, escenarios_base in baseline.items():
+        for nombre, base in escenarios_base.items():
+            actual = resultados.get(modo, {}).get(nombre)
+            if not actual:
+                continue
+            if actual['p99_ms'] > base['p99_ms'] * (1 + tolerancia):
+                regresiones.append(f"{modo}/{nombre}: p99 {base['p99_ms']} → {actual['p99_ms']} ms")
+            if actual['rps'] < base['rps'] * (1 - tolerancia):
+                regresiones.append(f"{modo}/{nombre}: {base['rps']} → {actual['rps']} peticiones/s")
+            if actual['errores'] > base['errores']:
+                regresiones.append(f"{modo}/{nombre}: {base['errores']} → {actual['errores']} errores")
+    return regresiones
+
+def imprimir(modo, resultados):
+    print(f"\n{'=' * 72}\n📊 {modo.upper()}\n{'=' * 72}")
+    print(f"{'escenario':<24}{'peticiones':>11}{'errores':>9}{'p50 ms':>10}{'p99 ms':>10}{'pet/s':>8}")
+    for nombre, r in resultados.items():
+        print(f"{nombre:<24}{r['peticiones']:>11}{r['errores']:>9}{r['p50_ms']:>10}{r['p99_ms']:>10}{r['rps']:>8}")
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark y prueba de carga de las rutas principales')
+    parser.add_argument('--modo', choices=['cliente', 'http', 'ambos'], default='ambos')
+    parser.add_argument('--peticiones', type=int, default=200, help='Peticiones por escenario')
+    parser.add_argument('--concurrencia', type=int, default=8, help='Hilos del generador de carga HTTP')
+    parser.add_argument('--url', help='Servidor ya arrancado (p. ej. gunicorn); por defecto uno local')
+    parser.add_argument('--escenarios', help='Lista separada por comas (por defecto, todos)')
+    parser.add_argument('--db', default=os.path.join(tempfile.gettempdir(), 'benchmark_hotel_limpieza.db'))
+    parser.add_argument('--habitaciones', type=int, default=2000)
+    parser.add_argument('--dias', type=int, default=730)
+    parser.add_argument('--reportes-dia', type=int, default=300)
+    parser.add_argument('--resembrar', action='store_true', help='Borrar y volver a sembrar la base')
+    parser.add_argument('--guardar-baseline', metavar='ARCHIVO')
+    parser.add_argument('--comparar', metavar='ARCHIVO')
+    parser.add_argument('--tolerancia', type=float, default=0.25, help='Margen antes de contar una regresión')
+    args = parser.parse_args()
+
+    if not args.url:
+        preparar_db(args.db, args)
+
+    import app as aplicacion
+    import fotos
+    app = aplicacion.app
+    app.config['UPLOAD_FOLDER'] = tempfile.mkdtemp(prefix='benchmark_uploads_')
+
+    lista = escenarios(foto_jpeg())
+    if args.escenarios:
+        elegidos = set(args.escenarios.split(','))
+        lista = [e for e in lista if e[0] in elegidos]
+    habitaciones = [h[0] for h in db.obtener_habitaciones()] if not args.url else ['101']
+
+    resultados = {}
+    if args.modo in ('cliente', 'ambos') and not args.url:
+        resultados['cliente'] = medir_cliente(app, lista, habitaciones, args.peticiones)
+        imprimir('cliente de pruebas de Flask', resultados['cliente'])
+    if args.modo in ('http', 'ambos'):
+        url = args.url or servidor_local(app)
+        resultados['http'] = medir_http(url, lista, habitaciones, args.peticiones, args.concurrencia)
+        imprimir(f'HTTP, {args.concurrencia} conexiones concurrentes', resultados['http'])
+
+    fotos.terminar()
+
+    if args.guardar_baseline:
+        with open(args.guardar_baseline, 'w') as f:
+            json.dump(resultados, f, indent=2, sort_keys=True)
+        print(f"\n💾 Baseline guardada en {args.guardar_baseline}")
+
+    if args.comparar:
+        with open(args.comparar) as f:
+            regresiones = comparar(resultados, json.load(f), args.tolerancia)
+        if regresiones:
+            print("\n❌ Regresiones respecto a la baseline:")
+            for linea in regresiones:
+                print(f"   {linea}")
+            sys.exit(1)
+        print("\n✅ Sin regresiones respecto a la baseline")
+
+if __name__ == '__main__':
+    main()
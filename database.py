@@ -1,310 +1,359 @@
+"""Backend SQLite de repositorio.py: conexiones, archivo histórico y búsqueda FTS5.
+
+Todo lo demás (consultas, migraciones, cachés) está en repositorio.py y es
+común con PostgreSQL; aquí solo queda lo que depende de SQLite.
+"""
 import sqlite3
-from datetime import datetime
+from datetime import date, timedelta
+from contextlib import contextmanager
+import queue
+import re
+import time
 import os
+import metricas
 
 DB_NAME = 'hotel_limpieza.db'
 
-def init_db():
-    """Inicializa la base de datos con las tablas necesarias"""
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-
-    # Tabla de usuarios (camareras y jefa)
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS usuarios (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            nombre TEXT NOT NULL,
-            usuario TEXT UNIQUE NOT NULL,
-            password TEXT NOT NULL,
-            rol TEXT NOT NULL,
-            activo INTEGER DEFAULT 1
+# Los reportes más antiguos que esto (en meses completos) se pasan al archivo histórico
+DIAS_EN_CALIENTE = int(os.environ.get('DIAS_EN_CALIENTE', 180))
+
+# Fragmentos de SQL propios de SQLite que usa repositorio.py
+SQL = {
+    'id': 'INTEGER PRIMARY KEY AUTOINCREMENT',
+    'sin_rowid': 'WITHOUT ROWID',
+    'mes': 'substr({}, 1, 7)',
+    'segundos': "strftime('%s', {})",
+    # BEGIN IMMEDIATE ya bloquea toda la base: no hace falta bloquear filas
+    'para_actualizar': '',
+}
+
+# ==================== CONEXIONES ====================
+
+# Conexiones abiertas que se reutilizan entre peticiones
+POOL_SIZE = 8
+BUSY_TIMEOUT_MS = 5000
+CACHED_STATEMENTS = 256
+
+_pool = queue.LifoQueue(maxsize=POOL_SIZE)
+
+class Conexion(sqlite3.Connection):
+    """sqlite3.Connection que mide cada sentencia (ver metricas.consulta_ejecutada)"""
+
+    def execute(self, sql, params=()):
+        inicio = time.perf_counter()
+        try:
+            return super().execute(sql, params)
+        finally:
+            metricas.consulta_ejecutada(sql, time.perf_counter() - inicio)
+
+    def executemany(self, sql, filas):
+        inicio = time.perf_counter()
+        try:
+            return super().executemany(sql, filas)
+        finally:
+            metricas.consulta_ejecutada(sql, time.perf_counter() - inicio)
+
+def _nueva_conexion():
+    """Abre una conexión SQLite con los pragmas de rendimiento"""
+    conn = sqlite3.connect(
+        DB_NAME,
+        timeout=BUSY_TIMEOUT_MS / 1000,
+        check_same_thread=False,
+        cached_statements=CACHED_STATEMENTS,
+        factory=Conexion
+    )
+    conn.execute('PRAGMA journal_mode = WAL')
+    conn.execute('PRAGMA synchronous = NORMAL')
+    conn.execute('PRAGMA cache_size = -16000')
+    conn.execute('PRAGMA mmap_size = 67108864')
+    conn.execute('PRAGMA temp_store = MEMORY')
+    conn.execute(f'PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}')
+
+    # Archivo histórico: tablas mensuales en un archivo aparte (ver archivar_reportes)
+    conn.execute('ATTACH DATABASE ? AS archivo', (ruta_archivo(),))
+    conn.execute('PRAGMA archivo.journal_mode = WAL')
+    conn.execute('PRAGMA archivo.synchronous = NORMAL')
+    return conn
+
+def ruta_archivo():
+    """Archivo SQLite con los reportes archivados, junto a DB_NAME"""
+    return os.path.splitext(DB_NAME)[0] + '_archivo.db'
+
+@contextmanager
+def conexion(escritura=False):
+    """Presta una conexión del pool; confirma al salir o revierte si hay error.
+    Con escritura=True toma el bloqueo de escritura al empezar (BEGIN IMMEDIATE)."""
+    try:
+        conn = _pool.get_nowait()
+    except queue.Empty:
+        conn = _nueva_conexion()
+    metricas.conexion_prestada()
+
+    try:
+        if escritura:
+            inicio = time.perf_counter()
+            conn.execute('BEGIN IMMEDIATE')
+            metricas.espera_bloqueo.observar(time.perf_counter() - inicio)
+        yield conn
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    finally:
+        try:
+            _pool.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+def cerrar_conexiones():
+    """Cierra todas las conexiones del pool (p. ej. al cambiar DB_NAME)"""
+    while True:
+        try:
+            _pool.get_nowait().close()
+        except queue.Empty:
+            break
+
+def _reiniciar_tras_fork():
+    """Un proceso hijo (p. ej. un worker de gunicorn) no puede reutilizar las conexiones del padre"""
+    global _pool
+    _pool = queue.LifoQueue(maxsize=POOL_SIZE)
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reiniciar_tras_fork)
+
+def bloquear(conn, claves):
+    """Las escrituras ya van de una en una (BEGIN IMMEDIATE): no hay nada más que bloquear"""
+
+def recorrer(conn, sql, params, lote):
+    """Filas de la consulta, pedidas de lote en lote"""
+    cursor = conn.execute(sql, params)
+    while True:
+        filas = cursor.fetchmany(lote)
+        if not filas:
+            break
+        yield from filas
+
+# ==================== MIGRACIONES ====================
+
+@contextmanager
+def transaccion_migracion(conn):
+    """Cada migración en su propia transacción de escritura"""
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        yield
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+
+def leer_version(conn):
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+def guardar_version(conn, version):
+    conn.execute(f'PRAGMA user_version = {int(version)}')
+
+# ==================== BÚSQUEDA ====================
+
+_PISO_DE_NEW = '(SELECT piso FROM habitaciones WHERE numero = NEW.habitacion_numero)'
+
+def crear_busqueda(conn):
+    """Tabla FTS5 sobre las observaciones, con triggers que la mantienen al día"""
+    # Guarda su propia copia del texto, la habitación, el piso y la fecha: así
+    # sigue sirviendo para los reportes archivados, que ya no están en reportes.
+    # Habitación y piso se indexan para filtrar con MATCH sin recorrer resultados.
+    conn.execute('''
+        CREATE VIRTUAL TABLE IF NOT EXISTS reportes_fts USING fts5(
+            observaciones,
+            habitacion_numero,
+            piso,
+            fecha UNINDEXED,
+            tokenize = 'unicode61 remove_diacritics 2'
         )
     ''')
-
-    # Tabla de habitaciones
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS habitaciones (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            numero TEXT UNIQUE NOT NULL,
-            piso INTEGER NOT NULL,
-            tipo TEXT,
-            activa INTEGER DEFAULT 1
-        )
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS reportes_fts_insertar AFTER INSERT ON reportes
+        WHEN NEW.observaciones IS NOT NULL AND NEW.observaciones != ''
+        BEGIN
+            INSERT INTO reportes_fts (rowid, observaciones, habitacion_numero, piso, fecha)
+            VALUES (NEW.id, NEW.observaciones, NEW.habitacion_numero, {_PISO_DE_NEW}, NEW.fecha);
+        END
     ''')
-
-    # Tabla de reportes de limpieza
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS reportes (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            habitacion_numero TEXT NOT NULL,
-            camarera_id INTEGER NOT NULL,
-            camarera_nombre TEXT NOT NULL,
-            fecha DATE NOT NULL,
-            hora_inicio TIME NOT NULL,
-            hora_fin TIME,
-            tareas_realizadas TEXT NOT NULL,
-            estado TEXT NOT NULL,
-            observaciones TEXT,
-            foto_path TEXT,
-            aprobado INTEGER DEFAULT 0,
-            FOREIGN KEY (camarera_id) REFERENCES usuarios(id)
-        )
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS reportes_fts_eliminar AFTER DELETE ON reportes
+        BEGIN
+            DELETE FROM reportes_fts WHERE rowid = OLD.id;
+        END
     ''')
-
-    # Insertar usuarios de prueba si no existen
-    cursor.execute("SELECT COUNT(*) FROM usuarios")
-    if cursor.fetchone()[0] == 0:
-        usuarios_default = [
-            ('Administrador', 'admin', 'admin123', 'admin'),
-            ('Jefa de Área', 'jefa', '123456', 'jefa'),
-            ('María González', 'maria', '1234', 'camarera'),
-            ('Ana López', 'ana', '1234', 'camarera'),
-            ('Carmen Ruiz', 'carmen', '1234', 'camarera')
-        ]
-        cursor.executemany(
-            'INSERT INTO usuarios (nombre, usuario, password, rol) VALUES (?, ?, ?, ?)',
-            usuarios_default
-        )
-
-    # Insertar habitaciones de prueba si no existen
-    cursor.execute("SELECT COUNT(*) FROM habitaciones")
-    if cursor.fetchone()[0] == 0:
-        habitaciones = []
-        # Generar habitaciones del 101 al 110, 201 al 210, 301 al 310
-        for piso in range(1, 4):
-            for num in range(1, 11):
-                numero = f"{piso}0{num}"
-                tipo = "Doble" if num % 2 == 0 else "Sencilla"
-                habitaciones.append((numero, piso, tipo))
-
-        cursor.executemany(
-            'INSERT INTO habitaciones (numero, piso, tipo) VALUES (?, ?, ?)',
-            habitaciones
-        )
-
-    conn.commit()
-    conn.close()
-    print("✅ Base de datos inicializada correctamente")
-
-def verificar_usuario(usuario, password):
-    """Verifica credenciales de usuario"""
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-    cursor.execute(
-        'SELECT id, nombre, rol FROM usuarios WHERE usuario = ? AND password = ? AND activo = 1',
-        (usuario, password)
-    )
-    resultado = cursor.fetchone()
-    conn.close()
-    return resultado
-
-def guardar_reporte(datos):
-    """Guarda un nuevo reporte de limpieza"""
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-
-    cursor.execute('''
-        INSERT INTO reportes
-        (habitacion_numero, camarera_id, camarera_nombre, fecha, hora_inicio,
-         tareas_realizadas, estado, observaciones, foto_path)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-    ''', (
-        datos['habitacion'],
-        datos['camarera_id'],
-        datos['camarera_nombre'],
-        datos['fecha'],
-        datos['hora_inicio'],
-        datos['tareas'],
-        datos['estado'],
-        datos['observaciones'],
-        datos.get('foto_path', '')
-    ))
-
-    conn.commit()
-    reporte_id = cursor.lastrowid
-    conn.close()
-    return reporte_id
-
-def obtener_reportes_hoy():
-    """Obtiene todos los reportes del día actual"""
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-
-    hoy = datetime.now().strftime('%Y-%m-%d')
-    cursor.execute('''
-        SELECT id, habitacion_numero, camarera_nombre, hora_inicio,
-               estado, observaciones, foto_path, aprobado
-        FROM reportes
-        WHERE fecha = ?
-        ORDER BY hora_inicio DESC
-    ''', (hoy,))
-
-    reportes = cursor.fetchall()
-    conn.close()
-    return reportes
-
-def obtener_reporte_detalle(reporte_id):
-    """Obtiene el detalle completo de un reporte"""
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-
-    cursor.execute('''
-        SELECT * FROM reportes WHERE id = ?
-    ''', (reporte_id,))
-
-    reporte = cursor.fetchone()
-    conn.close()
-    return reporte
-
-def obtener_habitaciones():
-    """Obtiene todas las habitaciones activas"""
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-
-    cursor.execute('SELECT numero, piso, tipo FROM habitaciones WHERE activa = 1 ORDER BY numero')
-    habitaciones = cursor.fetchall()
-    conn.close()
-    return habitaciones
-
-def obtener_estadisticas_hoy():
-    """Obtiene estadísticas del día"""
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-
-    hoy = datetime.now().strftime('%Y-%m-%d')
-
-    # Total de habitaciones
-    cursor.execute('SELECT COUNT(*) FROM habitaciones WHERE activa = 1')
-    total_habitaciones = cursor.fetchone()[0]
-
-    # Habitaciones limpiadas hoy
-    cursor.execute('SELECT COUNT(*) FROM reportes WHERE fecha = ?', (hoy,))
-    limpias = cursor.fetchone()[0]
-
-    # Con observaciones
-    cursor.execute('''
-        SELECT COUNT(*) FROM reportes
-        WHERE fecha = ? AND (observaciones IS NOT NULL AND observaciones != '')
-    ''', (hoy,))
-    con_observaciones = cursor.fetchone()[0]
-
-    conn.close()
-
-    return {
-        'total': total_habitaciones,
-        'limpias': limpias,
-        'pendientes': total_habitaciones - limpias,
-        'con_observaciones': con_observaciones
-    }
-
-# ==================== FUNCIONES ADMIN ====================
-
-def obtener_usuarios():
-    """Obtiene todos los usuarios"""
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-    cursor.execute('SELECT id, nombre, usuario, password, rol, activo FROM usuarios ORDER BY id')
-    usuarios = cursor.fetchall()
-    conn.close()
-    return usuarios
-
-def crear_usuario(nombre, usuario, password, rol):
-    """Crea un nuevo usuario"""
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-    cursor.execute(
-        'INSERT INTO usuarios (nombre, usuario, password, rol) VALUES (?, ?, ?, ?)',
-        (nombre, usuario, password, rol)
-    )
-    conn.commit()
-    conn.close()
-
-def actualizar_usuario(id, nombre, usuario, password, rol):
-    """Actualiza un usuario existente"""
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-    if password:
-        cursor.execute(
-            'UPDATE usuarios SET nombre = ?, usuario = ?, password = ?, rol = ? WHERE id = ?',
-            (nombre, usuario, password, rol, id)
-        )
-    else:
-        cursor.execute(
-            'UPDATE usuarios SET nombre = ?, usuario = ?, rol = ? WHERE id = ?',
-            (nombre, usuario, rol, id)
-        )
-    conn.commit()
-    conn.close()
-
-def eliminar_usuario(id):
-    """Desactiva un usuario"""
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-    cursor.execute('UPDATE usuarios SET activo = 0 WHERE id = ?', (id,))
-    conn.commit()
-    conn.close()
-
-def obtener_todas_habitaciones():
-    """Obtiene todas las habitaciones (activas e inactivas)"""
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-    cursor.execute('SELECT id, numero, piso, tipo, activa FROM habitaciones ORDER BY numero')
-    habitaciones = cursor.fetchall()
-    conn.close()
-    return habitaciones
-
-def crear_habitacion(numero, piso, tipo):
-    """Crea una nueva habitación"""
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-    cursor.execute(
-        'INSERT INTO habitaciones (numero, piso, tipo) VALUES (?, ?, ?)',
-        (numero, piso, tipo)
-    )
-    conn.commit()
-    conn.close()
-
-def actualizar_habitacion(id, numero, piso, tipo):
-    """Actualiza una habitación existente"""
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-    cursor.execute(
-        'UPDATE habitaciones SET numero = ?, piso = ?, tipo = ? WHERE id = ?',
-        (numero, piso, tipo, id)
-    )
-    conn.commit()
-    conn.close()
-
-def eliminar_habitacion(id):
-    """Desactiva una habitación"""
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-    cursor.execute('UPDATE habitaciones SET activa = 0 WHERE id = ?', (id,))
-    conn.commit()
-    conn.close()
-
-def obtener_todos_reportes():
-    """Obtiene todos los reportes"""
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-    cursor.execute('''
-        SELECT id, habitacion_numero, camarera_nombre, fecha, hora_inicio,
-               estado, observaciones, foto_path
-        FROM reportes
-        ORDER BY fecha DESC, hora_inicio DESC
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS reportes_fts_actualizar
+        AFTER UPDATE OF observaciones, habitacion_numero, fecha ON reportes
+        BEGIN
+            DELETE FROM reportes_fts WHERE rowid = OLD.id;
+            INSERT INTO reportes_fts (rowid, observaciones, habitacion_numero, piso, fecha)
+            SELECT NEW.id, NEW.observaciones, NEW.habitacion_numero, {_PISO_DE_NEW}, NEW.fecha
+            WHERE NEW.observaciones IS NOT NULL AND NEW.observaciones != '';
+        END
     ''')
-    reportes = cursor.fetchall()
-    conn.close()
-    return reportes
-
-def eliminar_reporte(id):
-    """Elimina un reporte"""
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-    cursor.execute('DELETE FROM reportes WHERE id = ?', (id,))
-    conn.commit()
-    conn.close()
-
-# Inicializar la base de datos al importar el módulo
-if __name__ == '__main__':
-    init_db()
+
+    # Reportes existentes, también los archivados
+    for tabla in tablas_reportes(conn):
+        _indexar_busqueda(conn, tabla)
+    conn.execute("INSERT INTO reportes_fts (reportes_fts) VALUES ('optimize')")
+
+def _indexar_busqueda(conn, tabla, where='1', params=()):
+    """Añade al índice de búsqueda los reportes de tabla que aún no están"""
+    conn.execute(f'''
+        INSERT INTO reportes_fts (rowid, observaciones, habitacion_numero, piso, fecha)
+        SELECT r.id, r.observaciones, r.habitacion_numero, h.piso, r.fecha
+        FROM {tabla} r
+        LEFT JOIN habitaciones h ON h.numero = r.habitacion_numero
+        WHERE {where} AND r.observaciones IS NOT NULL AND r.observaciones != ''
+          AND r.id NOT IN (SELECT rowid FROM reportes_fts)
+    ''', params)
+
+def quitar_de_busqueda(conn, id):
+    """Las tablas archivadas no tienen trigger que quite el reporte del índice de búsqueda"""
+    conn.execute('DELETE FROM reportes_fts WHERE rowid = ?', (id,))
+
+def _frase_fts(texto, prefijo=False):
+    """Cada palabra entre comillas (sin operadores de FTS5); con prefijo, también sus continuaciones"""
+    palabras = re.findall(r'\w+', texto or '')[:10]
+    return ' '.join(f'"{palabra}"' + ('*' if prefijo else '') for palabra in palabras)
+
+def consulta_fts(texto, habitacion=None, piso=None):
+    """Consulta FTS5 segura: las palabras del usuario, todas obligatorias y como prefijo,
+    sobre las observaciones; habitación y piso como filtros de columna"""
+    palabras = _frase_fts(texto, prefijo=True)
+    if not palabras:
+        return ''
+    partes = [f'observaciones : ({palabras})']
+    if habitacion and _frase_fts(habitacion):
+        partes.append(f'habitacion_numero : ({_frase_fts(habitacion)})')
+    if piso:
+        partes.append(f'piso : "{int(piso)}"')
+    return ' AND '.join(partes)
+
+# Relevancia de FTS5 por las observaciones (habitación y piso solo filtran): menor es mejor
+_RELEVANCIA = 'bm25(reportes_fts, 1.0, 0.0, 0.0)'
+
+def buscar(conn, texto, filtros, despues, limite, marcas):
+    """(id, fragmento, relevancia) de los reportes cuyas observaciones coinciden, de más a menos
+    relevante. despues es la (relevancia, id) del último resultado de la página anterior."""
+    consulta = consulta_fts(texto, filtros.get('habitacion'), filtros.get('piso'))
+    if not consulta:
+        return []
+
+    condiciones = ['reportes_fts MATCH ?']
+    params = [consulta]
+    if filtros.get('desde'):
+        condiciones.append('fecha >= ?')
+        params.append(filtros['desde'])
+    if filtros.get('hasta'):
+        condiciones.append('fecha <= ?')
+        params.append(filtros['hasta'])
+    if despues:
+        condiciones.append(f'({_RELEVANCIA} > ? OR ({_RELEVANCIA} = ? AND rowid < ?))')
+        params += [despues[0], despues[0], despues[1]]
+
+    pagina = conn.execute(f'''
+        SELECT rowid, {_RELEVANCIA} FROM reportes_fts
+        WHERE {' AND '.join(condiciones)}
+        ORDER BY 2, rowid DESC
+        LIMIT ?
+    ''', params + [limite]).fetchall()
+    if not pagina:
+        return []
+
+    # El fragmento solo se calcula para los resultados de la página
+    fragmentos = dict(conn.execute(f'''
+        SELECT rowid, snippet(reportes_fts, 0, ?, ?, '…', 12) FROM reportes_fts
+        WHERE reportes_fts MATCH ? AND rowid IN ({",".join("?" * len(pagina))})
+    ''', list(marcas) + [consulta] + [id for id, _ in pagina]).fetchall())
+    return [(id, fragmentos[id], relevancia) for id, relevancia in pagina]
+
+# ==================== ARCHIVO HISTÓRICO ====================
+#
+# Los meses completos más antiguos que DIAS_EN_CALIENTE se mueven de
+# reportes a tablas mensuales (reportes_AAAA_MM) en un archivo SQLite
+# adjunto como "archivo". Los ids se conservan, así que un reporte
+# archivado se sigue encontrando por id. Las consultas del día a día solo
+# tocan reportes; repositorio.py recorre el archivo cuando el rango de
+# fechas lo pide.
+
+_PATRON_TABLA_ARCHIVO = 'reportes_[0-9][0-9][0-9][0-9]_[0-9][0-9]'
+
+def tablas_reportes(conn, desde=None, hasta=None):
+    """Tablas con reportes que pueden tener fechas entre desde y hasta, de la más reciente a la más antigua"""
+    tablas = ['reportes']
+    for (nombre,) in conn.execute(
+        "SELECT name FROM archivo.sqlite_master WHERE type = 'table' AND name GLOB ? ORDER BY name DESC",
+        (_PATRON_TABLA_ARCHIVO,)
+    ):
+        mes = nombre[9:].replace('_', '-')
+        if (not desde or desde[:7] <= mes) and (not hasta or mes <= hasta[:7]):
+            tablas.append(f'archivo.{nombre}')
+    return tablas
+
+def _columnas_reportes(conn):
+    """Definición de cada columna de reportes, para replicarla en el archivo"""
+    columnas = {}
+    for _, nombre, tipo, no_nulo, defecto, clave in conn.execute('PRAGMA main.table_info(reportes)'):
+        if clave:
+            columnas[nombre] = f'{nombre} INTEGER PRIMARY KEY'
+        else:
+            columnas[nombre] = (f'{nombre} {tipo}' + (' NOT NULL' if no_nulo else '')
+                                + (f' DEFAULT {defecto}' if defecto is not None else ''))
+    return columnas
+
+def sincronizar(conn):
+    """Añade a las tablas archivadas las columnas que las migraciones agregaron a reportes"""
+    columnas = _columnas_reportes(conn)
+    for tabla in tablas_reportes(conn)[1:]:
+        esquema, nombre = tabla.split('.')
+        existentes = {c[1] for c in conn.execute(f'PRAGMA {esquema}.table_info({nombre})')}
+        for columna, definicion in columnas.items():
+            if columna not in existentes:
+                conn.execute(f'ALTER TABLE {tabla} ADD COLUMN {definicion}')
+
+def archivar_reportes(dias=DIAS_EN_CALIENTE):
+    """Mueve al archivo los meses completos anteriores a hoy - dias; devuelve cuántos reportes movió.
+
+    Cada mes se mueve en su propia transacción para no retener el bloqueo de
+    escritura mucho tiempo. Se puede repetir sin riesgo: si un mes quedó a medias
+    (el archivo y la base principal confirman por separado) se completa.
+    """
+    corte = (date.today() - timedelta(days=dias)).replace(day=1).isoformat()
+
+    with conexion() as conn:
+        meses = [fila[0] for fila in conn.execute(
+            'SELECT DISTINCT substr(fecha, 1, 7) FROM reportes WHERE fecha < ? ORDER BY 1', (corte,)
+        )]
+        columnas = _columnas_reportes(conn)
+
+    lista = ', '.join(columnas)
+    movidos = 0
+    for mes in meses:
+        tabla = f"reportes_{mes.replace('-', '_')}"
+        siguiente = (date.fromisoformat(f'{mes}-01') + timedelta(days=31)).replace(day=1)
+        rango = (f'{mes}-01', siguiente.isoformat())
+        with conexion(escritura=True) as conn:
+            conn.execute(f'CREATE TABLE IF NOT EXISTS archivo.{tabla} ({", ".join(columnas.values())})')
+            conn.execute(f'CREATE INDEX IF NOT EXISTS archivo.idx_{tabla}_fecha_hora ON {tabla} (fecha, hora_inicio)')
+            conn.execute(f'''
+                INSERT OR IGNORE INTO archivo.{tabla} ({lista})
+                SELECT {lista} FROM main.reportes WHERE fecha >= ? AND fecha < ?
+            ''', rango)
+            movidos += conn.execute(f'''
+                DELETE FROM main.reportes
+                WHERE fecha >= ? AND fecha < ? AND id IN (SELECT id FROM archivo.{tabla})
+            ''', rango).rowcount
+            # El trigger de borrado los quitó del índice de búsqueda: se vuelven a indexar
+            _indexar_busqueda(conn, f'archivo.{tabla}', 'r.fecha >= ? AND r.fecha < ?', rango)
+        print(f"📦 {mes}: archivado en {tabla}")
+
+    return movidos
+
+def compactar():
+    """Devuelve al sistema el espacio que dejaron libre los reportes archivados"""
+    with conexion() as conn:
+        conn.execute('VACUUM main')
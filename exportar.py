@@ -0,0 +1,168 @@
+import io
+import os
+import re
+import csv
+import zipfile
+from xml.sax.saxutils import escape
+
+# Cada cuántas filas se entrega un trozo de la respuesta
+FILAS_POR_BLOQUE = 500
+CHUNK_SIZE = 64 * 1024
+
+COLUMNAS = ['ID', 'Habitación', 'Camarera', 'Fecha', 'Hora', 'Tareas',
+            'Estado', 'Observaciones', 'Aprobado']
+
+# Caracteres de control que no admite XML 1.0
+_CONTROL = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+class _Salida(io.RawIOBase):
+    """Destino de escritura (sin seek) que acumula bytes hasta que el generador los entrega"""
+
+    def __init__(self):
+        super().__init__()
+        self._partes = []
+
+    def writable(self):
+        return True
+
+    def write(self, datos):
+        self._partes.append(bytes(datos))
+        return len(datos)
+
+    def tomar(self):
+        datos = b''.join(self._partes)
+        self._partes = []
+        return datos
+
+def filas(reportes, columna_foto=None):
+    """Convierte los reportes (repositorio.iterar_reportes) en filas de exportación.
+    columna_foto(ruta) da el valor de la columna Foto; sin ella no se incluye."""
+    yield COLUMNAS + (['Foto'] if columna_foto else [])
+    for reporte_id, habitacion, camarera, fecha, hora, tareas, estado, observaciones, foto, aprobado in reportes:
+        fila = [reporte_id, habitacion, camarera, fecha, hora, tareas, estado,
+                observaciones or '', 'Sí' if aprobado else 'No']
+        if columna_foto:
+            fila.append(columna_foto(foto) if foto else '')
+        yield fila
+
+def _celda_csv(valor):
+    # Evita que Excel interprete como fórmula un texto escrito por el usuario
+    if isinstance(valor, str) and valor[:1] in ('=', '+', '-', '@'):
+        return "'" + valor
+    return valor
+
+def _escribir_csv(filas, destino):
+    """Escribe las filas en destino (binario) y cede el control cada FILAS_POR_BLOQUE filas"""
+    texto = io.TextIOWrapper(destino, encoding='utf-8-sig', newline='', write_through=True)
+    escritor = csv.writer(texto)
+    for i, fila in enumerate(filas, 1):
+        escritor.writerow([_celda_csv(v) for v in fila])
+        if i % FILAS_POR_BLOQUE == 0:
+            yield
+    texto.detach()
+
+def csv_stream(filas):
+    """CSV (UTF-8 con BOM para Excel) generado por trozos"""
+    salida = _Salida()
+    for _ in _escribir_csv(filas, salida):
+        yield salida.tomar()
+    yield salida.tomar()
+
+# ==================== XLSX ====================
+#
+# Un XLSX es un ZIP con unos pocos XML. La hoja se escribe fila a fila con
+# celdas de texto en línea, así que no hace falta tenerla entera en memoria.
+
+_XLSX_FIJOS = {
+    '[Content_Types].xml': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '</Types>'
+    ),
+    '_rels/.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+        'Target="xl/workbook.xml"/>'
+        '</Relationships>'
+    ),
+    'xl/workbook.xml': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+        '<sheets><sheet name="Reportes" sheetId="1" r:id="rId1"/></sheets>'
+        '</workbook>'
+    ),
+    'xl/_rels/workbook.xml.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+        'Target="worksheets/sheet1.xml"/>'
+        '</Relationships>'
+    ),
+}
+
+def _celda_xlsx(valor):
+    if isinstance(valor, (int, float)) and not isinstance(valor, bool):
+        return f'<c><v>{valor}</v></c>'
+    texto = escape(_CONTROL.sub('', str(valor)))
+    return f'<c t="inlineStr"><is><t xml:space="preserve">{texto}</t></is></c>'
+
+def xlsx_stream(filas):
+    """Libro XLSX de una hoja generado por trozos"""
+    salida = _Salida()
+    with zipfile.ZipFile(salida, 'w', zipfile.ZIP_DEFLATED) as libro:
+        for nombre, contenido in _XLSX_FIJOS.items():
+            libro.writestr(nombre, contenido)
+
+        with libro.open('xl/worksheets/sheet1.xml', 'w', force_zip64=True) as hoja:
+            hoja.write(b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                       b'<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+                       b'<sheetData>')
+            for i, fila in enumerate(filas, 1):
+                hoja.write(('<row>' + ''.join(_celda_xlsx(v) for v in fila) + '</row>').encode())
+                if i % FILAS_POR_BLOQUE == 0:
+                    yield salida.tomar()
+            hoja.write(b'</sheetData></worksheet>')
+    yield salida.tomar()
+
+# ==================== ZIP CON FOTOS ====================
+
+def zip_stream(reportes, carpeta):
+    """ZIP con reportes.csv y las fotos que referencia (en fotos/), generado por trozos.
+    Las fotos van sin comprimir: ya son JPEG."""
+    salida = _Salida()
+    rutas = []
+    vistas = set()
+
+    def columna_foto(ruta):
+        # Las fotos se guardan por contenido: una misma foto se incluye una sola vez
+        if ruta not in vistas:
+            vistas.add(ruta)
+            rutas.append(ruta)
+        return f'fotos/{ruta}'
+
+    with zipfile.ZipFile(salida, 'w', zipfile.ZIP_DEFLATED) as archivo:
+        with archivo.open('reportes.csv', 'w', force_zip64=True) as destino:
+            for _ in _escribir_csv(filas(reportes, columna_foto), destino):
+                yield salida.tomar()
+
+        for ruta in rutas:
+            origen = os.path.join(carpeta, ruta)
+            if not os.path.isfile(origen):
+                continue
+            info = zipfile.ZipInfo.from_file(origen, f'fotos/{ruta}')
+            info.compress_type = zipfile.ZIP_STORED
+            with open(origen, 'rb') as foto, archivo.open(info, 'w') as destino:
+                for bloque in iter(lambda: foto.read(CHUNK_SIZE), b''):
+                    destino.write(bloque)
+                    yield salida.tomar()
+    yield salida.tomar()
@@ -0,0 +1,227 @@
+import os
+import re
+import sys
+import uuid
+import shutil
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+import repositorio as db
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Sin Pillow las fotos se guardan tal cual, sin miniatura
+    Image = None
+
+# Lado máximo (en píxeles) de la foto guardada y de su miniatura
+MAX_LADO = 1600
+MAX_LADO_MINIATURA = 320
+CALIDAD_JPEG = 82
+
+CHUNK_SIZE = 64 * 1024
+
+# Variantes generadas bajo demanda: solo estos tamaños, con un tope de disco
+CARPETA_CACHE = 'cache'
+TAMANOS_VARIANTE = {160, 320, 640, 1280}
+MAX_BYTES_CACHE = 256 * 1024 * 1024
+
+# Las fotos se guardan por contenido: ab/cd/<sha256>.<ext>
+_RUTA_CONTENIDO = re.compile(r'^[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64}\.\w+$')
+
+_procesador = ThreadPoolExecutor(max_workers=2, thread_name_prefix='fotos')
+
+def _reiniciar_tras_fork():
+    # Los hilos del pool no sobreviven a un fork: cada proceso hijo crea el suyo
+    global _procesador
+    _procesador = ThreadPoolExecutor(max_workers=2, thread_name_prefix='fotos')
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reiniciar_tras_fork)
+
+# ==================== ALMACÉN POR CONTENIDO ====================
+
+def es_ruta_contenido(ruta):
+    return bool(_RUTA_CONTENIDO.match(ruta or ''))
+
+def _ruta_para(digest, extension):
+    return f'{digest[:2]}/{digest[2:4]}/{digest}.{extension.lower()}'
+
+def _hash_archivo(ruta):
+    h = hashlib.sha256()
+    with open(ruta, 'rb') as f:
+        for bloque in iter(lambda: f.read(CHUNK_SIZE), b''):
+            h.update(bloque)
+    return h.hexdigest()
+
+def _temporal(carpeta):
+    return os.path.join(carpeta, f'.{uuid.uuid4().hex}.part')
+
+def almacenar(carpeta, temporal, extension, digest=None):
+    """Mueve un archivo temporal a su ruta por contenido; si ya existe se descarta el duplicado.
+    Devuelve la ruta relativa a carpeta. Las referencias se llevan en la base de datos."""
+    digest = digest or _hash_archivo(temporal)
+    ruta = _ruta_para(digest, extension)
+    destino = os.path.join(carpeta, ruta)
+
+    if os.path.exists(destino):
+        os.remove(temporal)
+    else:
+        os.makedirs(os.path.dirname(destino), exist_ok=True)
+        os.replace(temporal, destino)
+    return ruta
+
+def borrar(carpeta, rutas):
+    """Borra del disco las fotos que ya no referencia ningún reporte"""
+    for ruta in rutas:
+        try:
+            os.remove(os.path.join(carpeta, ruta))
+        except FileNotFoundError:
+            pass
+
+def guardar_subida(file, carpeta, extension):
+    """Copia la subida a disco por bloques calculando su SHA-256 y la almacena por contenido"""
+    temporal = _temporal(carpeta)
+    h = hashlib.sha256()
+    try:
+        with open(temporal, 'wb') as salida:
+            while True:
+                bloque = file.stream.read(CHUNK_SIZE)
+                if not bloque:
+                    break
+                h.update(bloque)
+                salida.write(bloque)
+        return almacenar(carpeta, temporal, extension, h.hexdigest())
+    except BaseException:
+        if os.path.exists(temporal):
+            os.remove(temporal)
+        raise
+
+# ==================== PROCESAMIENTO ====================
+
+def procesar_foto(reporte_id, nombre, carpeta):
+    """Reescala la foto, elimina sus metadatos EXIF y genera la miniatura"""
+    if Image is None:
+        return
+
+    foto = _temporal(carpeta)
+    miniatura = _temporal(carpeta)
+    try:
+        with Image.open(os.path.join(carpeta, nombre)) as img:
+            # Aplicar la orientación EXIF antes de descartar los metadatos
+            img = ImageOps.exif_transpose(img).convert('RGB')
+            img.thumbnail((MAX_LADO, MAX_LADO))
+            img.save(foto, 'JPEG', quality=CALIDAD_JPEG, optimize=True)
+
+            img.thumbnail((MAX_LADO_MINIATURA, MAX_LADO_MINIATURA))
+            img.save(miniatura, 'JPEG', quality=CALIDAD_JPEG)
+
+        ruta_foto = almacenar(carpeta, foto, 'jpg')
+        ruta_miniatura = almacenar(carpeta, miniatura, 'jpg')
+    finally:
+        for temporal in (foto, miniatura):
+            if os.path.exists(temporal):
+                os.remove(temporal)
+
+    borrar(carpeta, db.reemplazar_fotos_reporte(reporte_id, ruta_foto, ruta_miniatura))
+
+def obtener_variante(carpeta, nombre, lado):
+    """Devuelve la ruta (relativa a carpeta) de la foto reducida a `lado` píxeles,
+    generándola la primera vez. Sin Pillow devuelve el original."""
+    if Image is None:
+        return nombre
+
+    relativa = f'{CARPETA_CACHE}/{lado}/{os.path.splitext(nombre)[0]}.jpg'
+    destino = os.path.join(carpeta, relativa)
+    if os.path.exists(destino):
+        # El mtime hace de marca de último uso para la poda
+        os.utime(destino)
+        return relativa
+
+    os.makedirs(os.path.dirname(destino), exist_ok=True)
+    temporal = f'{destino}.{uuid.uuid4().hex}.part'
+    with Image.open(os.path.join(carpeta, nombre)) as img:
+        img = ImageOps.exif_transpose(img).convert('RGB')
+        img.thumbnail((lado, lado))
+        img.save(temporal, 'JPEG', quality=CALIDAD_JPEG)
+    os.replace(temporal, destino)
+
+    podar_cache(os.path.join(carpeta, CARPETA_CACHE))
+    return relativa
+
+def podar_cache(carpeta_cache, max_bytes=MAX_BYTES_CACHE):
+    """Borra las variantes usadas hace más tiempo hasta quedar bajo max_bytes"""
+    archivos = []
+    total = 0
+    for raiz, _, nombres in os.walk(carpeta_cache):
+        for nombre in nombres:
+            ruta = os.path.join(raiz, nombre)
+            try:
+                info = os.stat(ruta)
+            except FileNotFoundError:
+                continue
+            archivos.append((info.st_mtime, info.st_size, ruta))
+            total += info.st_size
+
+    if total <= max_bytes:
+        return
+
+    for _, tamano, ruta in sorted(archivos):
+        try:
+            os.remove(ruta)
+        except FileNotFoundError:
+            pass
+        total -= tamano
+        if total <= max_bytes:
+            break
+
+def _registrar_error(futuro):
+    error = futuro.exception()
+    if error:
+        print(f"⚠️ Error procesando foto: {error}")
+
+def procesar_en_segundo_plano(reporte_id, nombre, carpeta):
+    """Encola el procesamiento de la foto sin bloquear la petición"""
+    futuro = _procesador.submit(procesar_foto, reporte_id, nombre, carpeta)
+    futuro.add_done_callback(_registrar_error)
+    return futuro
+
+def terminar():
+    """Espera a que terminen las fotos en proceso (al apagar el servidor)"""
+    _procesador.shutdown(wait=True)
+
+# ==================== MIGRACIÓN DE FOTOS ANTIGUAS ====================
+
+def migrar_fotos(carpeta):
+    """Pasa las fotos con nombre antiguo ({habitacion}_{timestamp}_{archivo}) al almacén por contenido"""
+    migradas = 0
+    for ruta in db.obtener_rutas_fotos():
+        if es_ruta_contenido(ruta):
+            continue
+
+        origen = os.path.join(carpeta, ruta)
+        if not os.path.isfile(origen):
+            print(f"⚠️ Falta el archivo {ruta}, se deja sin migrar")
+            continue
+
+        # El original no se toca hasta que la base apunta a la copia: si algo falla
+        # a medias los reportes siguen viendo su foto y se puede volver a lanzar
+        extension = os.path.splitext(ruta)[1].lstrip('.') or 'jpg'
+        temporal = _temporal(carpeta)
+        try:
+            os.link(origen, temporal)
+        except OSError:  # Sin enlaces duros (otro sistema de archivos, FAT...) se copia
+            shutil.copyfile(origen, temporal)
+        nueva = almacenar(carpeta, temporal, extension)
+        db.reubicar_foto(ruta, nueva)
+        os.remove(origen)
+        migradas += 1
+        print(f"✅ {ruta} → {nueva}")
+
+    print(f"\n{migradas} fotos migradas")
+    return migradas
+
+if __name__ == '__main__':
+    if sys.argv[1:] == ['migrar']:
+        db.init_db()
+        migrar_fotos('uploads')
+    else:
+        print("Uso: python fotos.py migrar")
@@ -1,20 +1,115 @@
 import qrcode
 import os
+import json
 import socket
-from database import obtener_habitaciones
+import hashlib
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import repositorio as db
 
-def generar_qrs():
-    """Genera códigos QR para todas las habitaciones"""
+QR_FOLDER = 'static/qrs'
+MANIFEST = 'manifest.json'
+
+# Parámetros de renderizado; si cambian se regeneran todos los QR
+PARAMETROS_QR = {
+    'version': 1,
+    'error_correction': 'L',
+    'box_size': 10,
+    'border': 4,
+}
+
+# Hoja imprimible: A4 a 150 ppp, 3 columnas x 4 filas
+HOJA_PX = (1240, 1754)
+HOJA_COLUMNAS = 3
+HOJA_FILAS = 4
+
+def _huella(url):
+    """Identifica la URL y los parámetros con los que se generó un QR"""
+    datos = json.dumps({'url': url, **PARAMETROS_QR}, sort_keys=True)
+    return hashlib.sha256(datos.encode()).hexdigest()
+
+def generar_qr(numero, url, qr_folder):
+    """Genera y guarda el QR de una habitación (se ejecuta en un proceso del pool)"""
+    qr = qrcode.QRCode(
+        version=PARAMETROS_QR['version'],
+        error_correction=qrcode.ERROR_CORRECT_L,
+        box_size=PARAMETROS_QR['box_size'],
+        border=PARAMETROS_QR['border'],
+    )
+
+    qr.add_data(url)
+    qr.make(fit=True)
+
+    # Generar imagen
+    img = qr.make_image(fill_color="black", back_color="white")
+
+    # Guardar
+    filename = f"{qr_folder}/habitacion_{numero}.png"
+    img.save(filename)
+    return numero
+
+def cargar_manifest(qr_folder):
+    try:
+        with open(os.path.join(qr_folder, MANIFEST)) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+def guardar_manifest(qr_folder, manifest):
+    ruta = os.path.join(qr_folder, MANIFEST)
+    with open(ruta + '.tmp', 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(ruta + '.tmp', ruta)
+
+def generar_hoja_pdf(numeros, qr_folder, destino):
+    """Junta los QR en un PDF de varias páginas, listo para imprimir"""
+    from PIL import Image, ImageDraw
+
+    ancho, alto = HOJA_PX
+    celda_ancho = ancho // HOJA_COLUMNAS
+    celda_alto = alto // HOJA_FILAS
+    por_hoja = HOJA_COLUMNAS * HOJA_FILAS
+
+    paginas = []
+    for inicio in range(0, len(numeros), por_hoja):
+        pagina = Image.new('RGB', HOJA_PX, 'white')
+        dibujo = ImageDraw.Draw(pagina)
+
+        for idx, numero in enumerate(numeros[inicio:inicio + por_hoja]):
+            x = (idx % HOJA_COLUMNAS) * celda_ancho
+            y = (idx // HOJA_COLUMNAS) * celda_alto
+
+            with Image.open(f"{qr_folder}/habitacion_{numero}.png") as qr:
+                lado = min(celda_ancho, celda_alto) - 60
+                qr = qr.convert('RGB').resize((lado, lado))
+                pagina.paste(qr, (x + (celda_ancho - lado) // 2, y + 10))
+
+            dibujo.text((x + celda_ancho // 2, y + celda_alto - 35),
+                        f"Habitación {numero}", fill='black', anchor='mm')
+
+        paginas.append(pagina)
+
+    if paginas:
+        paginas[0].save(destino, 'PDF', resolution=150, save_all=True, append_images=paginas[1:])
+    return len(paginas)
+
+def generar_qrs(base_url=None, procesos=None, forzar=False, pdf=None):
+    """Genera códigos QR para todas las habitaciones.
+
+    Solo regenera los QR cuya URL o parámetros cambiaron desde la última
+    ejecución (salvo con forzar=True) y los reparte entre varios procesos.
+    """
 
     # Crear carpeta si no existe
-    qr_folder = 'static/qrs'
+    qr_folder = QR_FOLDER
     if not os.path.exists(qr_folder):
         os.makedirs(qr_folder)
 
-    # Obtener IP local
-    hostname = socket.gethostname()
-    local_ip = socket.gethostbyname(hostname)
-    base_url = f"http://{local_ip}:3000/limpiar?hab="
+    if base_url is None:
+        # Obtener IP local
+        hostname = socket.gethostname()
+        local_ip = socket.gethostbyname(hostname)
+        base_url = f"http://{local_ip}:3000/limpiar?hab="
 
     print("\n" + "="*60)
     print("🔲 GENERADOR DE CÓDIGOS QR")
@@ -23,37 +118,43 @@ def generar_qrs():
     print("="*60 + "\n")
 
     # Obtener habitaciones de la base de datos
-    habitaciones = obtener_habitaciones()
+    habitaciones = db.obtener_habitaciones()
+    manifest = {} if forzar else cargar_manifest(qr_folder)
 
-    total = len(habitaciones)
-    print(f"Generando {total} códigos QR...\n")
-
-    for idx, hab in enumerate(habitaciones, 1):
+    pendientes = []
+    for hab in habitaciones:
         numero = hab[0]
         url = f"{base_url}{numero}"
+        huella = _huella(url)
+        existe = os.path.exists(f"{qr_folder}/habitacion_{numero}.png")
+        if manifest.get(numero) != huella or not existe:
+            pendientes.append((numero, url, huella))
 
-        # Crear QR
-        qr = qrcode.QRCode(
-            version=1,
-            error_correction=qrcode.ERROR_CORRECT_L,
-            box_size=10,
-            border=4,
-        )
-
-        qr.add_data(url)
-        qr.make(fit=True)
-
-        # Generar imagen
-        img = qr.make_image(fill_color="black", back_color="white")
+    total = len(habitaciones)
+    print(f"Generando {len(pendientes)} de {total} códigos QR "
+          f"({total - len(pendientes)} sin cambios)...\n")
 
-        # Guardar
-        filename = f"{qr_folder}/habitacion_{numero}.png"
-        img.save(filename)
+    huellas = {numero: huella for numero, _, huella in pendientes}
+    if pendientes:
+        # El manifest se guarda con cada QR terminado: si la ejecución se corta
+        # (error, Ctrl+C) la siguiente no repite los que ya se generaron
+        try:
+            with ProcessPoolExecutor(max_workers=procesos) as pool:
+                futuros = [pool.submit(generar_qr, numero, url, qr_folder) for numero, url, _ in pendientes]
+                for idx, futuro in enumerate(as_completed(futuros), 1):
+                    numero = futuro.result()
+                    manifest[numero] = huellas[numero]
+                    guardar_manifest(qr_folder, manifest)
+                    print(f"[{idx}/{len(pendientes)}] ✅ QR generado: Habitación {numero}")
+        finally:
+            guardar_manifest(qr_folder, manifest)
 
-        print(f"[{idx}/{total}] ✅ QR generado: Habitación {numero}")
+    if pdf:
+        paginas = generar_hoja_pdf([hab[0] for hab in habitaciones], qr_folder, pdf)
+        print(f"\n🖨️  Hoja imprimible: {os.path.abspath(pdf)} ({paginas} páginas)")
 
     print("\n" + "="*60)
-    print(f"✅ {total} códigos QR generados exitosamente")
+    print(f"✅ {total} códigos QR listos ({len(pendientes)} generados)")
     print(f"📁 Ubicación: {os.path.abspath(qr_folder)}")
     print("="*60)
     print("\n📌 INSTRUCCIONES:")
@@ -64,4 +165,11 @@ def generar_qrs():
     print("="*60 + "\n")
 
 if __name__ == '__main__':
-    generar_qrs()
+    parser = argparse.ArgumentParser(description='Genera los códigos QR de las habitaciones')
+    parser.add_argument('--url-base', help='URL base (por defecto http://<ip local>:3000/limpiar?hab=)')
+    parser.add_argument('--procesos', type=int, help='Procesos en paralelo (por defecto, uno por CPU)')
+    parser.add_argument('--todo', action='store_true', help='Regenerar todos aunque no hayan cambiado')
+    parser.add_argument('--pdf', help='Generar además un PDF imprimible con todos los QR')
+    args = parser.parse_args()
+
+    generar_qrs(args.url_base, args.procesos, args.todo, args.pdf)
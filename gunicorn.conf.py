@@ -0,0 +1,47 @@
+# Configuración de gunicorn para producción: gunicorn -c gunicorn.conf.py wsgi:app
+import os
+import tempfile
+import multiprocessing
+
+bind = f"0.0.0.0:{os.environ.get('PUERTO', 3000)}"
+
+# Varios procesos, cada uno con hilos: el dashboard mantiene abierta una conexión SSE
+# por pestaña y cada una ocupa un hilo mientras espera
+workers = int(os.environ.get('WORKERS', min(multiprocessing.cpu_count() * 2 + 1, 8)))
+worker_class = 'gthread'
+threads = int(os.environ.get('THREADS', 16))
+# Como mucho la mitad de los hilos de cada proceso para streams SSE (ver app.py):
+# el resto queda libre para los formularios y las subidas de fotos
+os.environ.setdefault('SSE_MAX_CONEXIONES', str(max(1, threads // 2)))
+
+# Cada worker vuelca sus métricas a un archivo de este directorio y /metrics las suma
+os.environ.setdefault('METRICAS_DIR', os.path.join(tempfile.gettempdir(), f"hotel-metricas-{os.environ.get('PUERTO', 3000)}"))
+
+# Las subidas lentas desde el móvil necesitan margen; al apagar se dejan terminar
+timeout = 120
+graceful_timeout = 60
+keepalive = 5
+
+# Reciclar procesos de vez en cuando acota el crecimiento de memoria
+max_requests = 5000
+max_requests_jitter = 500
+
+accesslog = '-'
+errorlog = '-'
+
+def on_starting(server):
+    # Las migraciones se aplican una sola vez, en el proceso maestro, antes de arrancar los workers
+    import repositorio as db
+    db.init_db()
+    db.cerrar_conexiones()
+    # Las métricas empiezan de cero en cada arranque
+    import metricas
+    metricas.limpiar_directorio()
+
+def worker_exit(server, worker):
+    # Terminar las fotos que quedaron en la cola de procesamiento
+    import fotos
+    fotos.terminar()
+    # Lo que midió el worker pasa al acumulado de METRICAS_DIR y su archivo se borra
+    import metricas
+    metricas.retirar()
@@ -0,0 +1,305 @@
+import os
+import glob
+import json
+import time
+import uuid
+import logging
+import threading
+import functools
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: sin gunicorn ni METRICAS_DIR, no hace falta
+    fcntl = None
+
+# Umbral del log de consultas lentas (ms); 0 lo desactiva
+SLOW_QUERY_MS = float(os.environ.get('SLOW_QUERY_MS', 0))
+
+# Con varios procesos (workers de gunicorn) cada uno vuelca sus series a un
+# archivo propio en este directorio y /metrics las suma todas. Sin él, cada
+# proceso solo expone lo suyo. gunicorn.conf.py lo define y lo vacía al arrancar.
+# Al terminar, cada worker suma lo suyo a ACUMULADO y borra su archivo.
+METRICAS_DIR = os.environ.get('METRICAS_DIR')
+ACUMULADO = 'acumulado.json'
+INTERVALO_VOLCADO = 5
+
+BUCKETS_SEGUNDOS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+BUCKETS_CANTIDAD = (0, 1, 2, 3, 5, 8, 13, 21)
+BUCKETS_BYTES = (1024, 16 * 1024, 128 * 1024, 512 * 1024, 1024 ** 2, 4 * 1024 ** 2, 16 * 1024 ** 2)
+
+log = logging.getLogger(__name__)
+log_lento = logging.getLogger('consultas_lentas')
+
+class Histograma:
+    """Histograma acumulativo al estilo Prometheus, con etiquetas"""
+
+    def __init__(self, nombre, ayuda, buckets, etiquetas=()):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.buckets = buckets
+        self.etiquetas = etiquetas
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observar(self, valor, *etiquetas):
+        etiquetas = tuple(str(e) for e in etiquetas)
+        with self._lock:
+            serie = self._series.get(etiquetas)
+            if serie is None:
+                serie = self._series[etiquetas] = [[0] * len(self.buckets), 0, 0.0]
+            for i, limite in enumerate(self.buckets):
+                if valor <= limite:
+                    serie[0][i] += 1
+            serie[1] += 1
+            serie[2] += valor
+
+    def series(self):
+        """Copia de las series de este proceso: [[etiquetas, cuentas, total, suma], ...]"""
+        with self._lock:
+            return [[list(etiquetas), list(cuentas), total, suma]
+                    for etiquetas, (cuentas, total, suma) in self._series.items()]
+
+    def reiniciar(self):
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def exponer(self, series):
+        """Líneas de exposición de las series dadas (las de todos los procesos, ver sumar_series)"""
+        lineas = [f'# HELP {self.nombre} {self.ayuda}', f'# TYPE {self.nombre} histogram']
+        for etiquetas, (cuentas, total, suma) in sorted(series.items()):
+            base = ','.join(f'{k}="{v}"' for k, v in zip(self.etiquetas, etiquetas))
+            sep = ',' if base else ''
+            for limite, cuenta in zip(self.buckets, cuentas):
+                lineas.append(f'{self.nombre}_bucket{{{base}{sep}le="{limite}"}} {cuenta}')
+            lineas.append(f'{self.nombre}_bucket{{{base}{sep}le="+Inf"}} {total}')
+            sufijo = f'{{{base}}}' if base else ''
+            lineas.append(f'{self.nombre}_sum{sufijo} {suma}')
+            lineas.append(f'{self.nombre}_count{sufijo} {total}')
+        return lineas
+
+peticiones = Histograma(
+    'http_peticion_segundos', 'Latencia de las peticiones HTTP',
+    BUCKETS_SEGUNDOS, ('endpoint', 'metodo', 'estado'))
+llamadas_por_peticion = Histograma(
+    'http_peticion_llamadas_db', 'Llamadas a funciones de repositorio.py por petición',
+    BUCKETS_CANTIDAD, ('endpoint',))
+consultas_por_peticion = Histograma(
+    'http_peticion_consultas_db', 'Sentencias SQL ejecutadas por petición',
+    BUCKETS_CANTIDAD, ('endpoint',))
+conexiones_por_peticion = Histograma(
+    'http_peticion_conexiones_db', 'Conexiones a la base de datos prestadas por petición',
+    BUCKETS_CANTIDAD, ('endpoint',))
+bytes_subidos = Histograma(
+    'http_subida_bytes', 'Bytes recibidos en peticiones con archivos',
+    BUCKETS_BYTES, ('endpoint',))
+llamadas_db = Histograma(
+    'db_llamada_segundos', 'Latencia de cada función de repositorio.py',
+    BUCKETS_SEGUNDOS, ('funcion',))
+consultas_db = Histograma(
+    'db_consulta_segundos', 'Latencia de cada sentencia SQL (execute/executemany de la conexión)',
+    BUCKETS_SEGUNDOS)
+espera_bloqueo = Histograma(
+    'db_espera_bloqueo_segundos', 'Tiempo esperando un bloqueo de escritura (BEGIN IMMEDIATE o pg_advisory_xact_lock)',
+    BUCKETS_SEGUNDOS)
+
+HISTOGRAMAS = [peticiones, llamadas_por_peticion, consultas_por_peticion, conexiones_por_peticion,
+               bytes_subidos, llamadas_db, consultas_db, espera_bloqueo]
+
+# Llamadas, sentencias y conexiones de la petición en curso (una por hilo)
+_peticion = threading.local()
+
+# ==================== BASE DE DATOS ====================
+
+def conexion_prestada():
+    """Lo llama conexion() de cada backend (database.py, postgres.py) cada vez que presta una conexión"""
+    _peticion.conexiones = getattr(_peticion, 'conexiones', 0) + 1
+
+def consulta_ejecutada(sql, duracion):
+    """Lo llama la conexión de cada backend por cada sentencia que envía a la base"""
+    consultas_db.observar(duracion)
+    _peticion.consultas = getattr(_peticion, 'consultas', 0) + 1
+    if SLOW_QUERY_MS and duracion * 1000 >= SLOW_QUERY_MS:
+        log_lento.warning('Consulta de %.1f ms: %.300s', duracion * 1000, ' '.join(sql.split()))
+
+def _instrumentar(nombre, funcion):
+    @functools.wraps(funcion)
+    def envoltura(*args, **kwargs):
+        inicio = time.perf_counter()
+        try:
+            return funcion(*args, **kwargs)
+        finally:
+            llamadas_db.observar(time.perf_counter() - inicio, nombre)
+            _peticion.llamadas = getattr(_peticion, 'llamadas', 0) + 1
+    return envoltura
+
+def instrumentar_modulo(modulo):
+    """Envuelve las funciones públicas de un módulo (repositorio.py) para medir cada llamada"""
+    for nombre, valor in list(vars(modulo).items()):
+        if (callable(valor) and not nombre.startswith('_') and not isinstance(valor, type)
+                and getattr(valor, '__module__', None) == modulo.__name__
+                and nombre not in ('conexion', 'cerrar_conexiones', 'cargar')):
+            setattr(modulo, nombre, _instrumentar(nombre, valor))
+
+# ==================== FLASK ====================
+
+def instrumentar_app(app):
+    """Registra los hooks que miden cada petición"""
+    from flask import request, g
+
+    @app.before_request
+    def _inicio_peticion():
+        g.inicio_peticion = time.perf_counter()
+        _peticion.llamadas = 0
+        _peticion.consultas = 0
+        _peticion.conexiones = 0
+        _iniciar_volcado()
+        if request.files or request.mimetype == 'multipart/form-data':
+            bytes_subidos.observar(request.content_length or 0, request.endpoint or '-')
+
+    @app.after_request
+    def _fin_peticion(respuesta):
+        inicio = g.pop('inicio_peticion', None)
+        if inicio is not None:
+            endpoint = request.endpoint or '-'
+            peticiones.observar(time.perf_counter() - inicio, endpoint, request.method, respuesta.status_code)
+            llamadas_por_peticion.observar(getattr(_peticion, 'llamadas', 0), endpoint)
+            consultas_por_peticion.observar(getattr(_peticion, 'consultas', 0), endpoint)
+            conexiones_por_peticion.observar(getattr(_peticion, 'conexiones', 0), endpoint)
+        return respuesta
+
+# ==================== VARIOS PROCESOS ====================
+
+_archivo = None
+_volcador = None
+_volcado_lock = threading.Lock()
+_retirado = False
+
+@contextmanager
+def _bloqueo_directorio(exclusivo=False):
+    """Bloqueo entre procesos sobre METRICAS_DIR: compartido para leer, exclusivo para retirar()"""
+    if fcntl is None:
+        yield
+        return
+    os.makedirs(METRICAS_DIR, exist_ok=True)
+    with open(os.path.join(METRICAS_DIR, '.bloqueo'), 'a') as f:
+        fcntl.flock(f, fcntl.LOCK_EX if exclusivo else fcntl.LOCK_SH)
+        yield
+
+def _escribir(ruta, datos):
+    """Se reemplaza entero (os.replace) para que quien lo lea nunca vea uno a medias"""
+    temporal = ruta + '.tmp'
+    with open(temporal, 'w') as f:
+        json.dump(datos, f)
+    os.replace(temporal, ruta)
+
+def _leer(ruta):
+    try:
+        with open(ruta) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def volcar():
+    """Escribe las series de este proceso en su archivo de METRICAS_DIR"""
+    global _archivo
+    if not METRICAS_DIR:
+        return
+    with _volcado_lock:
+        if _retirado:
+            return
+        if _archivo is None:
+            # El pid puede repetirse tras reciclar un worker: el sufijo evita pisar su archivo
+            _archivo = os.path.join(METRICAS_DIR, f'{os.getpid()}-{uuid.uuid4().hex[:8]}.json')
+            os.makedirs(METRICAS_DIR, exist_ok=True)
+        _escribir(_archivo, {h.nombre: h.series() for h in HISTOGRAMAS})
+
+def retirar():
+    """Al terminar un worker (worker_exit de gunicorn.conf.py): suma sus series a ACUMULADO y
+    borra su archivo, para que los workers reciclados no dejen un archivo cada uno"""
+    global _retirado
+    if not METRICAS_DIR:
+        return
+    with _volcado_lock, _bloqueo_directorio(exclusivo=True):
+        _retirado = True
+        ruta = os.path.join(METRICAS_DIR, ACUMULADO)
+        acumulado = _leer(ruta)
+        for histograma in HISTOGRAMAS:
+            series = {}
+            sumar_series(series, acumulado.get(histograma.nombre, []), histograma.buckets)
+            sumar_series(series, histograma.series(), histograma.buckets)
+            acumulado[histograma.nombre] = [[list(etiquetas), *serie] for etiquetas, serie in series.items()]
+            histograma.reiniciar()
+        _escribir(ruta, acumulado)
+        if _archivo and os.path.exists(_archivo):
+            os.remove(_archivo)
+
+def _volcar_periodicamente():
+    while True:
+        time.sleep(INTERVALO_VOLCADO)
+        try:
+            volcar()
+        except OSError:
+            log.exception('No se pudieron volcar las métricas a %s', METRICAS_DIR)
+
+def _iniciar_volcado():
+    """Arranca (una vez por proceso) el hilo que vuelca las series cada INTERVALO_VOLCADO segundos"""
+    global _volcador
+    if METRICAS_DIR and _volcador is None:
+        with _volcado_lock:
+            if _volcador is None:
+                _volcador = threading.Thread(target=_volcar_periodicamente, name='metricas', daemon=True)
+                _volcador.start()
+
+def limpiar_directorio():
+    """Borra los archivos de una ejecución anterior (lo llama gunicorn.conf.py al arrancar)"""
+    if not METRICAS_DIR:
+        return
+    for ruta in glob.glob(os.path.join(METRICAS_DIR, '*.json*')):
+        os.remove(ruta)
+
+def _reiniciar_tras_fork():
+    """Un proceso hijo empieza de cero: lo medido por el padre ya está en el archivo del padre"""
+    global _archivo, _volcador, _volcado_lock, _retirado
+    _archivo = None
+    _volcador = None
+    _volcado_lock = threading.Lock()
+    _retirado = False
+    for histograma in HISTOGRAMAS:
+        histograma.reiniciar()
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reiniciar_tras_fork)
+
+def sumar_series(series, filas, buckets):
+    """Acumula en series ({etiquetas: [cuentas, total, suma]}) las filas de un proceso"""
+    for etiquetas, cuentas, total, suma in filas:
+        if len(cuentas) != len(buckets):
+            continue  # de una versión con otros buckets
+        serie = series.setdefault(tuple(etiquetas), [[0] * len(buckets), 0, 0.0])
+        serie[0] = [a + b for a, b in zip(serie[0], cuentas)]
+        serie[1] += total
+        serie[2] += suma
+
+def exponer():
+    """Texto de todas las métricas en formato de exposición de Prometheus.
+    Suma las de este proceso (al momento), las volcadas por los demás en METRICAS_DIR y
+    ACUMULADO, con las de los workers que ya terminaron, para que los contadores no bajen."""
+    series = {h.nombre: {} for h in HISTOGRAMAS}
+    for histograma in HISTOGRAMAS:
+        sumar_series(series[histograma.nombre], histograma.series(), histograma.buckets)
+
+    if METRICAS_DIR:
+        # Con el bloqueo compartido ningún worker está pasando su archivo a ACUMULADO a la vez
+        with _bloqueo_directorio():
+            for ruta in glob.glob(os.path.join(METRICAS_DIR, '*.json')):
+                if ruta == _archivo:
+                    continue
+                datos = _leer(ruta)
+                for histograma in HISTOGRAMAS:
+                    sumar_series(series[histograma.nombre], datos.get(histograma.nombre, []), histograma.buckets)
+
+    lineas = []
+    for histograma in HISTOGRAMAS:
+        lineas.extend(histograma.exponer(series[histograma.nombre]))
+    return '\n'.join(lineas) + '\n'
@@ -0,0 +1,299 @@
+"""Backend PostgreSQL de repositorio.py.
+
+Se activa con DATABASE_URL=postgresql://... (ver repositorio.py). Las
+consultas son las de repositorio.py; este módulo pone las conexiones, el
+bloqueo de lo que se lee y luego se escribe y la búsqueda de texto completo.
+Devuelve las mismas filas que SQLite: fechas y horas como texto ISO.
+
+Diferencias con SQLite:
+- Las conexiones salen de un psycopg_pool.ConnectionPool por proceso y las
+  escrituras no se serializan: cada función que lee y luego escribe toma su
+  propio bloqueo (bloquear) o se apoya en ON CONFLICT / FOR UPDATE. Las altas
+  de reportes sí van de una en una para que los ids se confirmen en orden.
+- iterar_reportes lee con un cursor del servidor: las exportaciones grandes
+  no pasan enteras por la memoria del proceso.
+- La búsqueda usa un tsvector indexado con GIN en lugar de FTS5.
+- No hay archivo histórico: el servidor aguanta años de reportes en una
+  sola tabla, así que archivar_reportes sigue siendo solo de SQLite.
+"""
+from contextlib import contextmanager
+from functools import lru_cache
+import unicodedata
+import threading
+import hashlib
+import uuid
+import re
+import time
+import os
+import metricas
+
+try:
+    import psycopg
+    from psycopg.types.string import TextLoader
+    from psycopg.types.numeric import FloatLoader
+    from psycopg_pool import ConnectionPool
+except ImportError:  # Solo hace falta si se elige este backend
+    psycopg = None
+
+DATABASE_URL = None
+
+# Fragmentos de SQL propios de PostgreSQL que usa repositorio.py
+SQL = {
+    'id': 'INTEGER GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY',
+    'sin_rowid': '',
+    'mes': "to_char({}, 'YYYY-MM')",
+    'segundos': 'EXTRACT(EPOCH FROM {})',
+    'para_actualizar': ' FOR UPDATE',
+}
+
+# ==================== CONEXIONES ====================
+
+# Hasta una conexión por hilo de gunicorn (THREADS) para que ninguno espere al pool
+POOL_MIN = 2
+POOL_MAX = int(os.environ.get('PG_POOL_MAX', 16))
+POOL_TIMEOUT = 30
+
+# Clave del bloqueo (pg_advisory_xact_lock) que evita que dos hosts migren a la vez
+BLOQUEO_MIGRACIONES = 0x686f74656c
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def configurar(url):
+    """Apunta el módulo a la base de datos de url (cierra el pool anterior)"""
+    global DATABASE_URL
+    if psycopg is None:
+        raise RuntimeError('DATABASE_URL apunta a PostgreSQL pero no está instalado psycopg[pool]')
+    cerrar_conexiones()
+    DATABASE_URL = url
+
+def _configurar_conexion(conn):
+    """Fechas y horas como texto ISO y numeric como float, igual que las devuelve SQLite"""
+    conn.adapters.register_loader('date', TextLoader)
+    conn.adapters.register_loader('time', TextLoader)
+    conn.adapters.register_loader('numeric', FloatLoader)
+
+def _obtener_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(
+                    DATABASE_URL, min_size=POOL_MIN, max_size=POOL_MAX, timeout=POOL_TIMEOUT,
+                    configure=_configurar_conexion, kwargs={'options': '-c DateStyle=ISO'},
+                    name='hotel', open=True
+                )
+    return _pool
+
+@lru_cache(maxsize=512)
+def _marcadores(sql):
+    """El SQL de repositorio.py usa ? como sqlite3; psycopg espera %s (y % literal como %%)"""
+    return sql.replace('%', '%%').replace('?', '%s')
+
+class Conexion:
+    """Conexión psycopg con la misma forma de uso que sqlite3.Connection"""
+
+    def __init__(self, pg):
+        self.pg = pg
+
+    def execute(self, sql, params=()):
+        inicio = time.perf_counter()
+        try:
+            return self.pg.execute(_marcadores(sql), params)
+        finally:
+            metricas.consulta_ejecutada(sql, time.perf_counter() - inicio)
+
+    def executemany(self, sql, filas):
+        inicio = time.perf_counter()
+        try:
+            cursor = self.pg.cursor()
+            cursor.executemany(_marcadores(sql), filas)
+            return cursor
+        finally:
+            metricas.consulta_ejecutada(sql, time.perf_counter() - inicio)
+
+    def commit(self):
+        self.pg.commit()
+
+    def rollback(self):
+        self.pg.rollback()
+
+@contextmanager
+def conexion(escritura=False):
+    """Presta una conexión del pool; confirma al salir o revierte si hay error.
+    escritura no cambia nada: las escrituras no esperan a las demás (ver bloquear)."""
+    with _obtener_pool().connection() as pg:
+        metricas.conexion_prestada()
+        yield Conexion(pg)
+
+def cerrar_conexiones():
+    """Cierra el pool (se vuelve a abrir al pedir la próxima conexión)"""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+            _pool = None
+
+def _reiniciar_tras_fork():
+    """Un worker de gunicorn no puede reutilizar las conexiones ni los hilos del pool del padre"""
+    global _pool, _pool_lock
+    _pool = None
+    _pool_lock = threading.Lock()
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reiniciar_tras_fork)
+
+def _clave_bloqueo(clave):
+    return int.from_bytes(hashlib.blake2b(clave.encode(), digest_size=8).digest(), 'big', signed=True)
+
+def bloquear(conn, claves):
+    """Bloqueos de transacción (pg_advisory_xact_lock) sobre claves de texto, compartidos por
+    todos los procesos y hosts. Se toman ordenados para que dos transacciones no se esperen en cruz."""
+    numeros = sorted({_clave_bloqueo(clave) for clave in claves})
+    if not numeros:
+        return
+    inicio = time.perf_counter()
+    conn.execute('SELECT pg_advisory_xact_lock(clave) FROM unnest(?::bigint[]) AS clave', (numeros,))
+    metricas.espera_bloqueo.observar(time.perf_counter() - inicio)
+
+def recorrer(conn, sql, params, lote):
+    """Filas de la consulta con un cursor del servidor: llegan de lote en lote"""
+    with conn.pg.cursor(name=f'recorrer_{uuid.uuid4().hex}') as cursor:
+        cursor.itersize = lote
+        inicio = time.perf_counter()
+        cursor.execute(_marcadores(sql), params)
+        metricas.consulta_ejecutada(sql, time.perf_counter() - inicio)
+        yield from cursor
+
+def tablas_reportes(conn, desde=None, hasta=None):
+    """Sin archivo histórico: todos los reportes están en reportes"""
+    return ['reportes']
+
+def sincronizar(conn):
+    """No hay tablas archivadas que sincronizar"""
+
+# ==================== MIGRACIONES ====================
+
+@contextmanager
+def transaccion_migracion(conn):
+    """Cada migración en su propia transacción, con un bloqueo para que dos hosts
+    que arrancan a la vez no migren los dos"""
+    try:
+        conn.execute('SELECT pg_advisory_xact_lock(?)', (BLOQUEO_MIGRACIONES,))
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS version_esquema (
+                id INTEGER PRIMARY KEY CHECK (id = 1),
+                version INTEGER NOT NULL
+            )
+        ''')
+        conn.execute('INSERT INTO version_esquema VALUES (1, 0) ON CONFLICT DO NOTHING')
+        yield
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+
+def leer_version(conn):
+    fila = conn.execute('SELECT version FROM version_esquema').fetchone()
+    return fila[0] if fila else 0
+
+def guardar_version(conn, version):
+    conn.execute('UPDATE version_esquema SET version = ?', (version,))
+
+# ==================== BÚSQUEDA ====================
+
+# Ancho del fragmento que acompaña a cada resultado, en palabras
+PALABRAS_FRAGMENTO = 12
+
+# Quita tildes y diéresis antes de indexar (sin depender de la extensión unaccent)
+_CON_TILDE = 'áàâäãéèêëíìîïóòôöõúùûüñç'
+_SIN_TILDE = 'aaaaaeeeeiiiiooooouuuunc'
+
+def crear_busqueda(conn):
+    """Columna tsvector generada a partir de las observaciones, con índice GIN"""
+    conn.execute(f'''
+        ALTER TABLE reportes ADD COLUMN IF NOT EXISTS busqueda TSVECTOR GENERATED ALWAYS AS (
+            to_tsvector('simple'::regconfig,
+                        translate(lower(coalesce(observaciones, '')), '{_CON_TILDE}', '{_SIN_TILDE}'))
+        ) STORED
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_reportes_busqueda ON reportes USING GIN (busqueda)')
+
+def quitar_de_busqueda(conn, id):
+    """El índice vive en la propia fila: se va con ella"""
+
+def _normalizar(texto):
+    """Minúsculas y sin tildes, igual que la columna busqueda"""
+    return ''.join(c for c in unicodedata.normalize('NFKD', texto.lower())
+                   if not unicodedata.combining(c))
+
+def _palabras(texto):
+    return re.findall(r'[^\W_]+', _normalizar(texto or ''))[:10]
+
+def consulta_tsquery(texto):
+    """tsquery segura: las palabras del usuario, todas obligatorias y como prefijo"""
+    return ' & '.join(f"'{palabra}':*" for palabra in _palabras(texto))
+
+def _fragmento(texto, palabras, marcas):
+    """Unas PALABRAS_FRAGMENTO palabras alrededor de la primera coincidencia, con las
+    coincidencias entre las marcas (como snippet() de FTS5)"""
+    tokens = list(re.finditer(r'[^\W_]+', texto))
+    coincide = [i for i, t in enumerate(tokens) if _normalizar(t.group()).startswith(tuple(palabras))]
+    if not tokens:
+        return texto
+
+    primera = coincide[0] if coincide else 0
+    inicio = max(0, min(primera - PALABRAS_FRAGMENTO // 4, len(tokens) - PALABRAS_FRAGMENTO))
+    fin = min(inicio + PALABRAS_FRAGMENTO, len(tokens))
+    desde = tokens[inicio].start() if inicio else 0
+    hasta = tokens[fin - 1].end() if fin < len(tokens) else len(texto)
+
+    partes, posicion = [], desde
+    for i in coincide:
+        if inicio <= i < fin:
+            token = tokens[i]
+            partes += [texto[posicion:token.start()], marcas[0], token.group(), marcas[1]]
+            posicion = token.end()
+    partes.append(texto[posicion:hasta])
+    return ('…' if desde else '') + ''.join(partes) + ('…' if hasta < len(texto) else '')
+
+# La normalización 1 divide por la longitud del texto: a igualdad gana el más corto, como con bm25
+_RELEVANCIA = "ts_rank(busqueda, to_tsquery('simple', ?), 1)"
+
+def buscar(conn, texto, filtros, despues, limite, marcas):
+    """(id, fragmento, relevancia) de los reportes cuyas observaciones coinciden, de más a menos
+    relevante. despues es la (relevancia, id) del último resultado de la página anterior."""
+    consulta = consulta_tsquery(texto)
+    if not consulta:
+        return []
+
+    condiciones = ["busqueda @@ to_tsquery('simple', ?)"]
+    params = [consulta]
+    if filtros.get('habitacion'):
+        condiciones.append('habitacion_numero = ?')
+        params.append(filtros['habitacion'])
+    if filtros.get('piso'):
+        condiciones.append('habitacion_numero IN (SELECT numero FROM habitaciones WHERE piso = ?)')
+        params.append(int(filtros['piso']))
+    if filtros.get('desde'):
+        condiciones.append('fecha >= ?')
+        params.append(filtros['desde'])
+    if filtros.get('hasta'):
+        condiciones.append('fecha <= ?')
+        params.append(filtros['hasta'])
+    if despues:
+        # ts_rank es real: la relevancia de la página anterior se compara con la misma precisión
+        condiciones.append(f'({_RELEVANCIA} < ?::real OR ({_RELEVANCIA} = ?::real AND id < ?))')
+        params += [consulta, despues[0], consulta, despues[0], despues[1]]
+
+    encontrados = conn.execute(f'''
+        SELECT id, observaciones, {_RELEVANCIA} AS relevancia
+        FROM reportes
+        WHERE {' AND '.join(condiciones)}
+        ORDER BY relevancia DESC, id DESC
+        LIMIT ?
+    ''', [consulta] + params + [limite]).fetchall()
+
+    palabras = _palabras(texto)
+    return [(id, _fragmento(observaciones or '', palabras, marcas), relevancia)
+            for id, observaciones, relevancia in encontrados]
@@ -0,0 +1,161 @@
+// Cola local de reportes pendientes de enviar (IndexedDB)
+// La usan tanto formulario.html como el service worker (sw.js)
+
+// Una base por usuario: si otra camarera entra en el mismo móvil, sus
+// reportes no se envían con la sesión de quien los dejó pendientes
+const COLA_DB = 'limpieza-cola';
+const COLA_STORE = 'reportes';
+// Reportes que el servidor rechazó: se apartan para no reintentarlos sin fin
+const RECHAZADOS_STORE = 'rechazados';
+
+function abrirCola(usuarioId) {
+    return new Promise((resolve, reject) => {
+        const peticion = indexedDB.open(`${COLA_DB}-${usuarioId}`, 1);
+        peticion.onupgradeneeded = () => {
+            peticion.result.createObjectStore(COLA_STORE, { keyPath: 'idempotencia' });
+            peticion.result.createObjectStore(RECHAZADOS_STORE, { keyPath: 'idempotencia' });
+        };
+        peticion.onsuccess = () => resolve(peticion.result);
+        peticion.onerror = () => reject(peticion.error);
+    });
+}
+
+async function operacionCola(usuarioId, stores, modo, operacion) {
+    const db = await abrirCola(usuarioId);
+    return new Promise((resolve, reject) => {
+        const tx = db.transaction(stores, modo);
+        const peticion = operacion(tx);
+        tx.oncomplete = () => { db.close(); resolve(peticion && peticion.result); };
+        tx.onerror = () => { db.close(); reject(tx.error); };
+    });
+}
+
+function encolarReporte(usuarioId, reporte) {
+    return operacionCola(usuarioId, COLA_STORE, 'readwrite', tx => tx.objectStore(COLA_STORE).put(reporte));
+}
+
+function listarPendientes(usuarioId) {
+    return operacionCola(usuarioId, COLA_STORE, 'readonly', tx => tx.objectStore(COLA_STORE).getAll());
+}
+
+function quitarDeCola(usuarioId, idempotencia) {
+    return operacionCola(usuarioId, COLA_STORE, 'readwrite', tx => tx.objectStore(COLA_STORE).delete(idempotencia));
+}
+
+// Saca el reporte de la cola y lo guarda aparte con el motivo del rechazo
+function apartarReporte(usuarioId, reporte, error) {
+    return operacionCola(usuarioId, [COLA_STORE, RECHAZADOS_STORE], 'readwrite', tx => {
+        tx.objectStore(RECHAZADOS_STORE).put(Object.assign({}, reporte, { error }));
+        tx.objectStore(COLA_STORE).delete(reporte.idempotencia);
+    });
+}
+
+// Reportes por petición al reenviar la cola
+const TAMANO_LOTE = 10;
+
+function formDataDeLote(usuarioId, reportes) {
+    const formData = new FormData();
+    const campos = reportes.map((reporte, i) => {
+        if (reporte.foto) {
+            formData.append(`foto_${i}`, reporte.foto, `foto_${i}.jpg`);
+        }
+        return {
+            usuario_id: usuarioId,
+            habitacion: reporte.habitacion,
+            tareas: reporte.tareas,
+            estado: reporte.estado,
+            observaciones: reporte.observaciones,
+            idempotencia: reporte.idempotencia,
+            creado: reporte.creado,
+            foto: reporte.foto ? `foto_${i}` : null
+        };
+    });
+    formData.append('reportes', JSON.stringify(campos));
+    return formData;
+}
+
+async function enviarLote(usuarioId, reportes) {
+    const response = await fetch('/guardar-reportes-lote', {
+        method: 'POST',
+        body: formDataDeLote(usuarioId, reportes),
+        credentials: 'same-origin'
+    });
+    return { status: response.status, result: await response.json().catch(() => ({})) };
+}
+
+// Respuestas que pueden salir bien más tarde con los mismos datos: sesión
+// caducada o de otro usuario (401, 409), espera o saturación (408, 429) y
+// errores del servidor (5xx)
+function reintentable(status) {
+    return status === 401 || status === 408 || status === 409 || status === 429 || status >= 500;
+}
+
+// Envía los reportes pendientes de usuarioId por lotes. Se detiene al primer
+// fallo de red, de sesión o del servidor para no insistir contra un servidor
+// que no responde; lo que el servidor rechaza (4xx) se aparta.
+const vaciandoCola = {};
+
+function vaciarCola(usuarioId) {
+    if (!vaciandoCola[usuarioId]) {
+        vaciandoCola[usuarioId] = vaciarColaAhora(usuarioId).finally(() => { delete vaciandoCola[usuarioId]; });
+    }
+    return vaciandoCola[usuarioId];
+}
+
+async function vaciarColaAhora(usuarioId) {
+    const pendientes = await listarPendientes(usuarioId);
+    const resultados = {};
+    let enviados = 0;
+
+    const lotes = [];
+    for (let inicio = 0; inicio < pendientes.length; inicio += TAMANO_LOTE) {
+        lotes.push(pendientes.slice(inicio, inicio + TAMANO_LOTE));
+    }
+
+    while (lotes.length) {
+        const lote = lotes.shift();
+        let respuesta;
+        try {
+            respuesta = await enviarLote(usuarioId, lote);
+        } catch (error) {
+            break;
+        }
+
+        if (reintentable(respuesta.status)) {
+            break;
+        }
+
+        // El servidor rechazó el lote entero (400, 413...): se prueban sus reportes
+        // de uno en uno para apartar solo el que lo provoca. Sin resultados y sin
+        // 4xx (un portal cautivo que contesta 200 con su página) se reintenta luego.
+        if (!respuesta.result.resultados) {
+            if (respuesta.status < 400) {
+                break;
+            }
+            if (lote.length > 1) {
+                lotes.unshift(...lote.map(reporte => [reporte]));
+                continue;
+            }
+            const error = respuesta.result.error || `HTTP ${respuesta.status}`;
+            resultados[lote[0].idempotencia] = { success: false, error };
+            await apartarReporte(usuarioId, lote[0], error);
+            enviados++;
+            continue;
+        }
+
+        // Guardados, o rechazados por datos inválidos (no mejoran reintentando)
+        for (const [i, reporte] of lote.entries()) {
+            const result = respuesta.result.resultados[i] || { success: false, error: 'Sin respuesta del servidor' };
+            if (result.success) {
+                result.message = `Reporte de habitación ${reporte.habitacion} guardado correctamente`;
+                await quitarDeCola(usuarioId, reporte.idempotencia);
+            } else {
+                await apartarReporte(usuarioId, reporte, result.error);
+            }
+            resultados[reporte.idempotencia] = result;
+            enviados++;
+        }
+    }
+
+    return { enviados, pendientes: pendientes.length - enviados, resultados };
+}
@@ -0,0 +1,24 @@
+// Service worker: reenvía en segundo plano los reportes guardados sin conexión
+
+importScripts('/static/js/cola.js');
+
+// La etiqueta lleva el usuario cuya cola hay que enviar: enviar-reportes:<id>
+const SYNC_TAG = 'enviar-reportes:';
+
+self.addEventListener('install', () => self.skipWaiting());
+
+self.addEventListener('activate', event => {
+    event.waitUntil(self.clients.claim());
+});
+
+self.addEventListener('sync', event => {
+    if (!event.tag.startsWith(SYNC_TAG)) return;
+    const usuarioId = Number(event.tag.slice(SYNC_TAG.length));
+
+    // Si quedan pendientes se rechaza la promesa y el navegador reintenta con espera creciente
+    event.waitUntil(vaciarCola(usuarioId).then(r => {
+        if (r.pendientes > 0) {
+            throw new Error(`${r.pendientes} reportes pendientes`);
+        }
+    }));
+});
@@ -0,0 +1,100 @@
+"""Fixtures de las pruebas: cada prueba de la interfaz de repositorio.py corre
+contra un archivo SQLite temporal y contra una base PostgreSQL desechable.
+
+PostgreSQL se toma de TEST_DATABASE_URL (un servidor donde se puedan crear
+bases) o, si no está, se levanta uno local con pgserver. Sin ninguno de los
+dos las pruebas de PostgreSQL se saltan.
+"""
+from urllib.parse import urlsplit
+import contextlib
+import shutil
+import uuid
+import os
+
+import pytest
+
+import repositorio
+
+
+def _url_con_base(url, nombre):
+    return urlsplit(url)._replace(path='/' + nombre).geturl()
+
+
+@contextlib.contextmanager
+def _servidor(url):
+    """Conexión en autocommit a la base de mantenimiento del servidor (CREATE/DROP DATABASE)"""
+    import psycopg
+    with psycopg.connect(_url_con_base(url, 'postgres'), autocommit=True) as conn:
+        yield conn
+
+
+@pytest.fixture(scope='session')
+def servidor_postgres(tmp_path_factory):
+    """URL de un servidor PostgreSQL donde crear bases de prueba"""
+    try:
+        import psycopg  # noqa: F401
+    except ImportError:
+        pytest.skip('psycopg no está instalado')
+
+    url = os.environ.get('TEST_DATABASE_URL')
+    if url:
+        yield url
+        return
+
+    try:
+        import pgserver
+    except ImportError:
+        pytest.skip('Sin TEST_DATABASE_URL ni pgserver para levantar un PostgreSQL temporal')
+    servidor = pgserver.get_server(tmp_path_factory.mktemp('pgdata'), cleanup_mode='stop')
+    yield servidor.get_uri()
+    servidor.cleanup()
+
+
+@pytest.fixture(scope='session')
+def plantilla_sqlite(tmp_path_factory):
+    """Base SQLite ya migrada y con los datos iniciales; cada prueba trabaja sobre una copia"""
+    ruta = tmp_path_factory.mktemp('plantilla') / 'hotel.db'
+    repositorio.cargar(f'sqlite:///{ruta}')
+    repositorio.init_db()
+    repositorio.cerrar_conexiones()
+    return ruta
+
+
+@pytest.fixture(scope='session')
+def plantilla_postgres(servidor_postgres):
+    """Base PostgreSQL ya migrada y con los datos iniciales; cada prueba usa un CREATE DATABASE ... TEMPLATE"""
+    nombre = f'plantilla_{uuid.uuid4().hex[:12]}'
+    with _servidor(servidor_postgres) as conn:
+        conn.execute(f'CREATE DATABASE {nombre}')
+    repositorio.cargar(_url_con_base(servidor_postgres, nombre))
+    repositorio.init_db()
+    repositorio.cerrar_conexiones()
+
+    yield nombre
+
+    with _servidor(servidor_postgres) as conn:
+        conn.execute(f'DROP DATABASE IF EXISTS {nombre}')
+
+
+@pytest.fixture(params=['sqlite', 'postgres'])
+def db(request, tmp_path):
+    """repositorio.py apuntando a una base recién inicializada del backend de la prueba"""
+    if request.param == 'sqlite':
+        plantilla = request.getfixturevalue('plantilla_sqlite')
+        for origen in plantilla.parent.iterdir():
+            shutil.copy(origen, tmp_path / origen.name)
+        repositorio.cargar(f'sqlite:///{tmp_path / plantilla.name}')
+        yield repositorio
+        repositorio.cerrar_conexiones()
+        return
+
+    servidor = request.getfixturevalue('servidor_postgres')
+    plantilla = request.getfixturevalue('plantilla_postgres')
+    nombre = f'prueba_{uuid.uuid4().hex[:12]}'
+    with _servidor(servidor) as conn:
+        conn.execute(f'CREATE DATABASE {nombre} TEMPLATE {plantilla}')
+    repositorio.cargar(_url_con_base(servidor, nombre))
+    yield repositorio
+    repositorio.cerrar_conexiones()
+    with _servidor(servidor) as conn:
+        conn.execute(f'DROP DATABASE IF EXISTS {nombre}')
@@ -0,0 +1,230 @@
+"""Pruebas de las rutas de app.py que dependen de la base de datos"""
+from datetime import date, datetime, timedelta
+import io
+import json
+import threading
+import zipfile
+
+import pytest
+
+import app as aplicacion
+import fotos
+
+
+@pytest.fixture
+def cliente(db, tmp_path, monkeypatch):
+    monkeypatch.setitem(aplicacion.app.config, 'UPLOAD_FOLDER', str(tmp_path))
+    # La foto se procesa en segundo plano; aquí basta con que se guarde
+    monkeypatch.setattr(fotos, 'procesar_en_segundo_plano', lambda *args: None)
+    aplicacion.app.config['TESTING'] = True
+    return aplicacion.app.test_client()
+
+
+def _entrar(cliente, usuario, password):
+    cliente.get('/logout')
+    assert cliente.post('/login', data={'usuario': usuario, 'password': password}).status_code == 302
+
+
+def _lote(cliente, reportes, **archivos):
+    datos = {'reportes': json.dumps(reportes)}
+    datos.update(archivos)
+    respuesta = cliente.post('/guardar-reportes-lote', data=datos, content_type='multipart/form-data')
+    assert respuesta.status_code == 200
+    return respuesta.json['resultados']
+
+
+def _importado(**cambios):
+    reporte = {'habitacion': '101', 'tareas': ['Cambio de sábanas'], 'estado': 'Limpia y lista',
+               'camarera_id': 3, 'fecha': '2024-03-05', 'hora_inicio': '08:30'}
+    reporte.update(cambios)
+    return reporte
+
+# ==================== LOTES ====================
+
+def test_importacion_del_admin_conserva_fecha_y_hora(cliente, db):
+    _entrar(cliente, 'admin', 'admin123')
+    resultado, = _lote(cliente, [_importado()])
+
+    detalle = db.obtener_reporte_detalle(resultado['reporte_id'])
+    assert detalle[2:6] == (3, 'María González', '2024-03-05', '08:30:00')
+
+
+@pytest.mark.parametrize('cambios', [
+    {'fecha': '2024-13-40'},
+    {'fecha': '05/03/2024'},
+    {'hora_inicio': '25:00'},
+    {'fecha': ''},
+    {'fecha': (date.today() + timedelta(days=2)).isoformat()},
+    {'camarera_id': 999},
+    {'camarera_id': 1},
+])
+def test_importacion_del_admin_rechaza_datos_no_validos(cliente, db, cambios):
+    _entrar(cliente, 'admin', 'admin123')
+    mal, bien = _lote(cliente, [_importado(**cambios), _importado(habitacion='102')])
+
+    assert mal['success'] is False and mal['error']
+    assert bien['success'] is True
+    assert db.obtener_reporte_detalle(bien['reporte_id'])[1] == '102'
+
+
+def test_hora_del_movil_se_acota_en_la_cola_offline(cliente, db):
+    _entrar(cliente, 'maria', '1234')
+    hace_tres_dias = (datetime.now() - timedelta(days=3)).strftime('%Y-%m-%d %H:%M:%S')
+    reciente = (datetime.now() - timedelta(hours=2)).strftime('%Y-%m-%d %H:%M:%S')
+    viejo, bien = _lote(cliente, [
+        {'habitacion': '101', 'tareas': ['Cambio de sábanas'], 'estado': 'Limpia y lista',
+         'creado': hace_tres_dias, 'fecha': '2020-01-01'},
+        {'habitacion': '102', 'tareas': ['Cambio de sábanas'], 'estado': 'Limpia y lista', 'creado': reciente},
+    ])
+
+    assert db.obtener_reporte_detalle(viejo['reporte_id'])[4] == date.today().isoformat()
+    assert ' '.join(db.obtener_reporte_detalle(bien['reporte_id'])[4:6]) == reciente
+
+
+def test_reenvio_no_vuelve_a_guardar_la_foto(cliente, db, monkeypatch):
+    _entrar(cliente, 'maria', '1234')
+    reporte = {'habitacion': '101', 'tareas': ['Cambio de sábanas'], 'estado': 'Limpia y lista',
+               'idempotencia': 'k1', 'foto': 'f1'}
+    primero, = _lote(cliente, [reporte], f1=(io.BytesIO(b'foto'), 'a.jpg'))
+
+    guardadas = []
+    monkeypatch.setattr(fotos, 'guardar_subida', lambda *args: guardadas.append(args) or 'x.jpg')
+    segundo, repetido = _lote(cliente, [reporte, dict(reporte, habitacion='102')],
+                              f1=(io.BytesIO(b'otra foto'), 'a.jpg'))
+
+    assert guardadas == []
+    assert (segundo['reporte_id'], segundo['duplicado']) == (primero['reporte_id'], True)
+    assert (repetido['reporte_id'], repetido['duplicado']) == (primero['reporte_id'], True)
+
+
+def test_claves_repetidas_dentro_del_lote(cliente, db):
+    _entrar(cliente, 'maria', '1234')
+    reporte = {'habitacion': '101', 'tareas': ['Cambio de sábanas'], 'estado': 'Limpia y lista',
+               'idempotencia': 'k2'}
+    mal, primero, repetido = _lote(cliente, [dict(reporte, estado='x'), reporte, dict(reporte, habitacion='102')])
+
+    assert mal['success'] is False
+    assert (primero['duplicado'], repetido['duplicado']) == (False, True)
+    assert repetido['reporte_id'] == primero['reporte_id']
+    assert len(db.obtener_reportes_hoy()) == 1
+
+def test_cola_de_otro_usuario_no_se_guarda_con_esta_sesion(cliente, db):
+    _entrar(cliente, 'maria', '1234')
+    reporte = {'habitacion': '101', 'tareas': ['Cambio de sábanas'], 'estado': 'Limpia y lista'}
+    respuesta = cliente.post('/guardar-reportes-lote', data={
+        'reportes': json.dumps([dict(reporte, usuario_id=3), dict(reporte, usuario_id=4)])
+    })
+
+    assert respuesta.status_code == 409
+    assert db.obtener_reportes_hoy() == []
+    assert _lote(cliente, [dict(reporte, usuario_id=3)])[0]['success'] is True
+
+# ==================== EVENTOS ====================
+
+def test_stream_de_eventos_se_cierra_para_que_el_cliente_reconecte(cliente, monkeypatch):
+    monkeypatch.setattr(aplicacion, 'SSE_DURACION_MAX', 0.3)
+    monkeypatch.setattr(aplicacion, 'SSE_HEARTBEAT', 0.05)
+    _entrar(cliente, 'jefa', '123456')
+
+    cuerpo = cliente.get('/api/eventos?desde=999999').get_data(as_text=True)
+    assert cuerpo.startswith('retry: ')
+    assert ': ping' in cuerpo
+
+
+def test_limite_de_streams_de_eventos(cliente, monkeypatch):
+    monkeypatch.setattr(aplicacion, '_streams_abiertos', threading.BoundedSemaphore(1))
+    _entrar(cliente, 'jefa', '123456')
+
+    abierto = cliente.get('/api/eventos', buffered=False)
+    assert abierto.status_code == 200
+    lleno = cliente.get('/api/eventos', buffered=False)
+    assert lleno.status_code == 503 and lleno.headers['Retry-After']
+
+    abierto.close()
+    otro = cliente.get('/api/eventos', buffered=False)
+    assert otro.status_code == 200
+    otro.close()
+
+# ==================== CACHÉ HTTP ====================
+
+def test_etag_de_seleccionar_habitacion_cambia_con_la_version(cliente, monkeypatch):
+    _entrar(cliente, 'maria', '1234')
+    etag = cliente.get('/seleccionar-habitacion').headers['ETag']
+    assert cliente.get('/seleccionar-habitacion', headers={'If-None-Match': etag}).status_code == 304
+
+    monkeypatch.setattr(aplicacion, 'VERSION_APP', 'otra-version')
+    respuesta = cliente.get('/seleccionar-habitacion', headers={'If-None-Match': etag})
+    assert respuesta.status_code == 200
+    assert respuesta.headers['ETag'] != etag
+
+
+def test_version_app(monkeypatch):
+    monkeypatch.setenv('APP_VERSION', 'abc123')
+    assert aplicacion.calcular_version_app() == 'abc123'
+    monkeypatch.delenv('APP_VERSION')
+    assert aplicacion.calcular_version_app() == aplicacion.calcular_version_app() != 'abc123'
+
+# ==================== ADMIN ====================
+
+def test_panel_admin_muestra_estado_de_contraseñas_y_filtro_de_estados(cliente, db, monkeypatch):
+    with db.conexion(escritura=True) as conn:
+        conn.execute("INSERT INTO usuarios (nombre, usuario, password, rol) VALUES ('Eva', 'eva', 'clave', 'camarera')")
+    monkeypatch.setattr(aplicacion, 'ESTADOS', aplicacion.ESTADOS + ('En revisión',))
+    _entrar(cliente, 'admin', 'admin123')
+
+    html = cliente.get('/admin').get_data(as_text=True)
+    assert html.count('🔒 Cifrada') == 5
+    assert html.count('⚠️ Pendiente de cifrar') == 1
+    assert '<option value="En revisión"' in html
+
+
+@pytest.mark.parametrize('limite', [0, -5])
+def test_listado_admin_acota_el_limite_por_abajo(cliente, db, limite):
+    _entrar(cliente, 'admin', 'admin123')
+    _lote(cliente, [_importado(), _importado(habitacion='102')])
+
+    respuesta = cliente.get(f'/admin/api/reportes?limite={limite}')
+    assert respuesta.status_code == 200
+    assert len(respuesta.json['reportes']) == 1 and respuesta.json['siguiente']
+
+
+@pytest.mark.parametrize('formato', ['csv', 'xlsx', 'zip'])
+def test_exportar_reportes(cliente, db, formato):
+    _entrar(cliente, 'admin', 'admin123')
+    _lote(cliente, [_importado(observaciones='=grifo roto'), _importado(habitacion='102')])
+
+    parametros = {'formato': 'csv', 'fotos': 'zip'} if formato == 'zip' else {'formato': formato}
+    respuesta = cliente.get('/admin/exportar', query_string=parametros)
+    assert respuesta.status_code == 200
+    assert respuesta.headers['Content-Disposition'].endswith(f'.{formato}"')
+    datos = respuesta.get_data()
+
+    if formato == 'csv':
+        texto = datos.decode('utf-8-sig')
+    else:
+        with zipfile.ZipFile(io.BytesIO(datos)) as archivo:
+            assert archivo.testzip() is None
+            texto = archivo.read('reportes.csv' if formato == 'zip' else 'xl/worksheets/sheet1.xml').decode('utf-8-sig')
+    assert ('=grifo roto' if formato == 'xlsx' else "'=grifo roto") in texto
+    assert '102' in texto
+
+# ==================== MÉTRICAS ====================
+
+def test_metrics_es_privado(cliente, monkeypatch):
+    assert cliente.get('/metrics').status_code == 401
+    _entrar(cliente, 'jefa', '123456')
+    assert cliente.get('/metrics').status_code == 401
+
+    monkeypatch.setattr(aplicacion, 'METRICAS_TOKEN', 'secreto')
+    cliente.get('/logout')
+    assert cliente.get('/metrics', headers={'Authorization': 'Bearer otro'}).status_code == 401
+    assert cliente.get('/metrics', headers={'Authorization': 'Bearer secreto'}).status_code == 200
+
+
+def test_metrics_cuenta_las_sentencias_de_cada_peticion(cliente):
+    _entrar(cliente, 'admin', 'admin123')
+    cliente.get('/admin')
+
+    texto = cliente.get('/metrics').get_data(as_text=True)
+    assert 'http_peticion_consultas_db_count{endpoint="admin_panel"}' in texto
+    assert 'db_consulta_segundos_count' in texto
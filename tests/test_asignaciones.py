@@ -0,0 +1,111 @@
+"""Pruebas del reparto de habitaciones entre camareras (asignaciones.py, sin base de datos)"""
+import asignaciones
+
+# Tres pisos de diez habitaciones: 101..110, 201..210, 301..310
+HABITACIONES = [(f'{piso}{n:02d}', piso, 'Doble' if n % 2 else 'Individual')
+                for piso in (1, 2, 3) for n in range(1, 11)]
+PISOS = {numero: piso for numero, piso, _ in HABITACIONES}
+MINUTOS = {numero: 25 for numero, _, _ in HABITACIONES}
+
+
+def _colas(filas):
+    """{camarera_id: [habitaciones en su orden]}"""
+    colas = {}
+    for numero, camarera_id, _, _ in sorted(filas, key=lambda f: (f[1], f[2])):
+        colas.setdefault(camarera_id, []).append(numero)
+    return colas
+
+
+def _carga(filas, hechas=()):
+    carga = {}
+    for numero, camarera_id, _, minutos in filas:
+        carga[camarera_id] = carga.get(camarera_id, 0) + (0 if numero in hechas else minutos)
+    return carga
+
+
+def test_estimar_minutos():
+    habitaciones = [('101', 1, 'Suite'), ('102', 1, 'Suite'), ('103', 1, 'Doble')]
+    duraciones = [('101', 'Suite', 6, 40.0), ('102', 'Suite', 2, 20.0)]
+
+    assert asignaciones.estimar_minutos(habitaciones, duraciones) == {
+        '101': 40.0,                               # historial propio suficiente
+        '102': round((6 * 40 + 2 * 20) / 8, 1),    # promedio de su tipo
+        '103': asignaciones.MINUTOS_POR_DEFECTO,   # sin historial
+    }
+
+
+def test_reparto_equilibrado_y_por_pisos():
+    filas = asignaciones.repartir(HABITACIONES, [3, 4, 5, 6], MINUTOS)
+    colas = _colas(filas)
+
+    assert sorted(n for cola in colas.values() for n in cola) == sorted(MINUTOS)
+    assert max(map(len, colas.values())) - min(map(len, colas.values())) <= 1
+    # Cada cola es un tramo consecutivo en orden de recorrido: como mucho dos pisos
+    recorrido = sorted(MINUTOS, key=lambda n: (PISOS[n], n))
+    for cola in colas.values():
+        inicio = recorrido.index(cola[0])
+        assert cola == recorrido[inicio:inicio + len(cola)]
+        assert len({PISOS[n] for n in cola}) <= 2
+
+
+def test_reparto_equilibra_minutos_y_no_habitaciones():
+    minutos = dict(MINUTOS, **{f'1{n:02d}': 60 for n in range(1, 11)})
+    carga = _carga(asignaciones.repartir(HABITACIONES, [3, 4, 5], minutos))
+
+    assert max(carga.values()) - min(carga.values()) <= 60
+
+
+def test_hechas_primero_y_con_quien_las_hizo():
+    hechas = {'205': 4, '101': 5}
+    colas = _colas(asignaciones.repartir(HABITACIONES, [3, 4], MINUTOS, hechas))
+
+    assert colas[4][0] == '205'
+    # 5 no entra en el reparto: su habitación hecha sale del plan y no se vuelve a asignar
+    assert 5 not in colas
+    assert sorted(n for cola in colas.values() for n in cola) == sorted(set(MINUTOS) - {'101'})
+    assert abs(len(colas[3]) - (len(colas[4]) - 1)) <= 1
+
+
+def test_ausencia_y_rebalanceo_estable():
+    filas = asignaciones.repartir(HABITACIONES, [3, 4, 5], MINUTOS)
+    hechas = {numero: camarera for numero, camarera, orden, _ in filas if orden < 3}
+
+    # Falta la 5: lo pendiente se reparte entre las demás, lo hecho no se mueve
+    filas = asignaciones.repartir(HABITACIONES, [3, 4], MINUTOS, hechas)
+    colas = _colas(filas)
+    assert set(colas) == {3, 4}
+    assert all(colas[camarera][:3] == [n for n, c in hechas.items() if c == camarera]
+               for camarera in (3, 4))
+    pendientes = _carga(filas, hechas)
+    assert abs(pendientes[3] - pendientes[4]) <= 25
+
+    # Nadie quedó sin pendientes: no hay nada que rebalancear, ni aunque se pida dos veces
+    assert asignaciones.rebalancear(filas, hechas, PISOS) is None
+    assert asignaciones.rebalancear(filas, hechas, PISOS, siempre=True) is None
+
+
+def test_rebalancear_cuando_una_termina_antes():
+    filas = asignaciones.repartir(HABITACIONES, [3, 4, 5], MINUTOS)
+    colas = _colas(filas)
+    hechas = {numero: 3 for numero in colas[3]}
+    siguientes = {colas[4][0], colas[5][0]}
+
+    nuevas = asignaciones.rebalancear(filas, hechas, PISOS)
+    nuevas_colas = _colas(nuevas)
+    carga = _carga(nuevas, hechas)
+
+    assert sorted(f[0] for f in nuevas) == sorted(MINUTOS)
+    assert max(carga.values()) - min(carga.values()) <= 25
+    # Lo hecho va primero y la siguiente de cada cola no cambia de manos
+    assert nuevas_colas[3][:10] == colas[3]
+    assert {nuevas_colas[4][0], nuevas_colas[5][0]} == siguientes
+    # Volver a rebalancear el resultado no mueve nada más
+    assert asignaciones.rebalancear(nuevas, hechas, PISOS, siempre=True) is None
+
+
+def test_mover():
+    filas = asignaciones.repartir(HABITACIONES, [3, 4], MINUTOS)
+    colas = _colas(asignaciones.mover(filas, '101', 4))
+
+    assert '101' not in colas[3]
+    assert colas[4][-1] == '101'
@@ -0,0 +1,84 @@
+"""Pruebas de las exportaciones por trozos: se lee cada formato como lo haría quien lo descarga"""
+import csv
+import io
+import zipfile
+from xml.etree import ElementTree
+
+import exportar
+
+HOJA = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+
+
+def _reportes(cantidad=3):
+    reportes = [
+        (1, '101', 'María González', '2024-03-05', '08:30:00', 'Cambio de sábanas',
+         'Limpia y lista', '=grifo roto', 'ab/foto1.jpg', 1),
+        (2, '102', 'Ana López', '2024-03-05', '09:00:00', '', 'Requiere mantenimiento',
+         '+34 600\x01 <avisar>', 'ab/foto1.jpg', 0),
+        (3, '103', 'María González', '2024-03-05', '09:30:00', '', 'Limpia y lista', None, '', 0),
+    ]
+    return (reportes * cantidad)[:cantidad]
+
+
+def _juntar(trozos):
+    return b''.join(trozos)
+
+
+def _leer_csv(datos):
+    assert datos.startswith(b'\xef\xbb\xbf')
+    return list(csv.reader(io.StringIO(datos.decode('utf-8-sig'))))
+
+
+def test_csv_escapa_formulas():
+    filas = _leer_csv(_juntar(exportar.csv_stream(exportar.filas(_reportes()))))
+
+    assert filas[0] == exportar.COLUMNAS
+    assert [f[7] for f in filas[1:]] == ["'=grifo roto", "'+34 600\x01 <avisar>", '']
+    assert [f[8] for f in filas[1:]] == ['Sí', 'No', 'No']
+
+
+def test_csv_se_entrega_por_trozos(monkeypatch):
+    monkeypatch.setattr(exportar, 'FILAS_POR_BLOQUE', 2)
+    trozos = list(exportar.csv_stream(exportar.filas(_reportes())))
+
+    assert len([t for t in trozos if t]) >= 2
+    assert len(_leer_csv(_juntar(trozos))) == 4
+
+
+def test_xlsx_es_un_libro_valido(monkeypatch):
+    monkeypatch.setattr(exportar, 'FILAS_POR_BLOQUE', 2)
+    trozos = list(exportar.xlsx_stream(exportar.filas(_reportes())))
+    assert len([t for t in trozos if t]) >= 2
+
+    with zipfile.ZipFile(io.BytesIO(_juntar(trozos))) as libro:
+        assert libro.testzip() is None
+        assert {'[Content_Types].xml', 'xl/workbook.xml', 'xl/worksheets/sheet1.xml'} <= set(libro.namelist())
+        hoja = ElementTree.fromstring(libro.read('xl/worksheets/sheet1.xml'))
+
+    filas = [[''.join(c.itertext()) for c in fila] for fila in hoja.iter(f'{HOJA}row')]
+    assert filas[0] == exportar.COLUMNAS
+    assert filas[1][0] == '1' and filas[1][7] == '=grifo roto'
+    # Sin caracteres de control (no valen en XML) y con < escapado
+    assert filas[2][7] == '+34 600 <avisar>'
+    # El texto va como inlineStr: Excel no lo evalúa como fórmula
+    celda = list(hoja.iter(f'{HOJA}row'))[1][7]
+    assert celda.get('t') == 'inlineStr' and celda.find(f'{HOJA}f') is None
+
+
+def test_zip_con_fotos(tmp_path):
+    (tmp_path / 'ab').mkdir()
+    (tmp_path / 'ab' / 'foto1.jpg').write_bytes(b'\xff\xd8jpeg')
+    reportes = _reportes() + [(4, '104', 'Ana López', '2024-03-05', '10:00:00', '', 'Limpia y lista',
+                               '', 'cd/perdida.jpg', 0)]
+
+    with zipfile.ZipFile(io.BytesIO(_juntar(exportar.zip_stream(reportes, str(tmp_path))))) as archivo:
+        assert archivo.testzip() is None
+        # La foto compartida va una sola vez; la que no está en disco no se incluye
+        assert archivo.namelist() == ['reportes.csv', 'fotos/ab/foto1.jpg']
+        assert archivo.read('fotos/ab/foto1.jpg') == b'\xff\xd8jpeg'
+        assert archivo.getinfo('fotos/ab/foto1.jpg').compress_type == zipfile.ZIP_STORED
+        filas = _leer_csv(archivo.read('reportes.csv'))
+
+    assert filas[0] == exportar.COLUMNAS + ['Foto']
+    assert [f[9] for f in filas[1:]] == ['fotos/ab/foto1.jpg', 'fotos/ab/foto1.jpg', '', 'fotos/cd/perdida.jpg']
+    assert filas[1][7] == "'=grifo roto"
@@ -0,0 +1,46 @@
+"""Pruebas de la migración de fotos antiguas al almacén por contenido"""
+from datetime import date
+
+import pytest
+
+import fotos
+
+
+def _reporte_con_foto(db, foto_path):
+    return db.guardar_reporte({
+        'habitacion': '101', 'camarera_id': 3, 'camarera_nombre': 'María González',
+        'fecha': date.today().isoformat(), 'hora_inicio': '10:00:00', 'tareas': '',
+        'estado': 'Limpia y lista', 'observaciones': '', 'foto_path': foto_path,
+    })
+
+
+def test_migrar_fotos(db, tmp_path):
+    (tmp_path / '101_1700000000_foto.jpg').write_bytes(b'foto')
+    id = _reporte_con_foto(db, '101_1700000000_foto.jpg')
+
+    assert fotos.migrar_fotos(str(tmp_path)) == 1
+
+    nueva = db.obtener_reporte_detalle(id)[10]
+    assert fotos.es_ruta_contenido(nueva)
+    assert (tmp_path / nueva).read_bytes() == b'foto'
+    assert not (tmp_path / '101_1700000000_foto.jpg').exists()
+    assert fotos.migrar_fotos(str(tmp_path)) == 0
+
+
+def test_migrar_fotos_conserva_el_original_si_falla_la_base(db, tmp_path, monkeypatch):
+    (tmp_path / '101_1700000000_foto.jpg').write_bytes(b'foto')
+    id = _reporte_con_foto(db, '101_1700000000_foto.jpg')
+
+    def falla(ruta_anterior, ruta_nueva):
+        raise RuntimeError('base caída')
+
+    monkeypatch.setattr(db, 'reubicar_foto', falla)
+    with pytest.raises(RuntimeError):
+        fotos.migrar_fotos(str(tmp_path))
+    assert db.obtener_reporte_detalle(id)[10] == '101_1700000000_foto.jpg'
+    assert (tmp_path / '101_1700000000_foto.jpg').read_bytes() == b'foto'
+
+    # Al volver a lanzarla se completa
+    monkeypatch.undo()
+    assert fotos.migrar_fotos(str(tmp_path)) == 1
+    assert fotos.es_ruta_contenido(db.obtener_reporte_detalle(id)[10])
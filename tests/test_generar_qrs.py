@@ -0,0 +1,37 @@
+"""Pruebas de la generación incremental de los QR de las habitaciones"""
+import pytest
+
+import generar_qrs
+
+
+@pytest.fixture
+def carpeta(tmp_path, monkeypatch):
+    monkeypatch.setattr(generar_qrs, 'QR_FOLDER', str(tmp_path))
+    return tmp_path
+
+
+def test_solo_regenera_lo_que_cambio(db, carpeta):
+    generar_qrs.generar_qrs('http://hotel/limpiar?hab=', procesos=2)
+    assert len(generar_qrs.cargar_manifest(str(carpeta))) == 30
+
+    (carpeta / 'habitacion_101.png').unlink()
+    antes = {ruta.name: ruta.stat().st_mtime_ns for ruta in carpeta.glob('*.png')}
+    generar_qrs.generar_qrs('http://hotel/limpiar?hab=', procesos=2)
+
+    assert (carpeta / 'habitacion_101.png').exists()
+    assert all((carpeta / nombre).stat().st_mtime_ns == mtime for nombre, mtime in antes.items())
+
+
+def test_manifest_guarda_lo_generado_si_la_ejecucion_falla(db, carpeta):
+    # Un directorio con el nombre del PNG hace fallar esa habitación
+    (carpeta / 'habitacion_205.png').mkdir()
+    with pytest.raises(OSError):
+        generar_qrs.generar_qrs('http://hotel/limpiar?hab=', procesos=2)
+
+    manifest = generar_qrs.cargar_manifest(str(carpeta))
+    assert manifest and '205' not in manifest
+    assert all((carpeta / f'habitacion_{numero}.png').is_file() for numero in manifest)
+
+    (carpeta / 'habitacion_205.png').rmdir()
+    generar_qrs.generar_qrs('http://hotel/limpiar?hab=', procesos=2)
+    assert len(generar_qrs.cargar_manifest(str(carpeta))) == 30
@@ -0,0 +1,80 @@
+"""Pruebas de las métricas compartidas entre procesos"""
+import multiprocessing
+import re
+
+import pytest
+
+import metricas
+
+
+@pytest.fixture
+def directorio(tmp_path, monkeypatch):
+    monkeypatch.setattr(metricas, 'METRICAS_DIR', str(tmp_path))
+    monkeypatch.setattr(metricas, '_archivo', None)
+    return tmp_path
+
+
+def _valor(texto, serie):
+    encontrado = re.search(rf'^{re.escape(serie)} (\S+)$', texto, re.M)
+    return float(encontrado.group(1)) if encontrado else 0
+
+
+def _worker():
+    metricas.espera_bloqueo.observar(0.002)
+    metricas.espera_bloqueo.observar(0.002)
+    metricas.volcar()
+
+
+@pytest.mark.skipif('fork' not in multiprocessing.get_all_start_methods(), reason='sin fork')
+def test_exponer_suma_los_procesos(directorio):
+    antes = _valor(metricas.exponer(), 'db_espera_bloqueo_segundos_count')
+    metricas.espera_bloqueo.observar(0.002)
+
+    for _ in range(2):
+        proceso = multiprocessing.get_context('fork').Process(target=_worker)
+        proceso.start()
+        proceso.join()
+        assert proceso.exitcode == 0
+
+    texto = metricas.exponer()
+    assert len(list(directorio.glob('*.json'))) == 2
+    assert _valor(texto, 'db_espera_bloqueo_segundos_count') == antes + 5
+    assert _valor(texto, 'db_espera_bloqueo_segundos_bucket{le="0.0025"}') >= 5
+
+    metricas.limpiar_directorio()
+    assert list(directorio.glob('*.json')) == []
+
+
+def _worker_reciclado():
+    metricas.espera_bloqueo.observar(0.002)
+    metricas.volcar()
+    metricas.retirar()
+
+
+@pytest.mark.skipif('fork' not in multiprocessing.get_all_start_methods(), reason='sin fork')
+def test_workers_reciclados_pasan_al_acumulado(directorio):
+    antes = _valor(metricas.exponer(), 'db_espera_bloqueo_segundos_count')
+
+    for _ in range(3):
+        proceso = multiprocessing.get_context('fork').Process(target=_worker_reciclado)
+        proceso.start()
+        proceso.join()
+        assert proceso.exitcode == 0
+    vivo = multiprocessing.get_context('fork').Process(target=_worker)
+    vivo.start()
+    vivo.join()
+
+    archivos = [ruta.name for ruta in directorio.glob('*.json')]
+    assert len(archivos) == 2 and metricas.ACUMULADO in archivos
+    assert _valor(metricas.exponer(), 'db_espera_bloqueo_segundos_count') == antes + 5
+
+
+def test_cuenta_las_sentencias_sql(db):
+    # La primera conexión del pool ejecuta además sus PRAGMA al abrirse
+    with db.conexion():
+        pass
+    antes = _valor(metricas.exponer(), 'db_consulta_segundos_count')
+    with db.conexion() as conn:
+        conn.execute('SELECT 1')
+        conn.executemany('UPDATE usuarios SET nombre = nombre WHERE id = ?', [(1,), (2,)])
+    assert _valor(metricas.exponer(), 'db_consulta_segundos_count') == antes + 2
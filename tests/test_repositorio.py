@@ -0,0 +1,440 @@
+"""Pruebas de la interfaz de repositorio.py, iguales para SQLite y PostgreSQL (ver conftest.py)"""
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+from datetime import date, timedelta
+import pathlib
+import re
+import threading
+
+import pytest
+
+import repositorio
+
+HOY = date.today().isoformat()
+
+
+def _reporte(habitacion='101', hora='10:00:00', **cambios):
+    datos = {
+        'habitacion': habitacion, 'camarera_id': 3, 'camarera_nombre': 'María González',
+        'fecha': HOY, 'hora_inicio': hora, 'tareas': 'Cambio de sábanas', 'tareas_mask': 1,
+        'estado': 'Limpia y lista', 'observaciones': '', 'foto_path': '',
+    }
+    datos.update(cambios)
+    return datos
+
+
+def test_interfaz_cubierta():
+    """Cada función de repositorio.INTERFAZ se llama en alguna prueba de este archivo"""
+    fuente = pathlib.Path(__file__).read_text(encoding='utf-8')
+    usadas = set(re.findall(r'\bdb\.(\w+)\(', fuente))
+    assert set(repositorio.INTERFAZ) - usadas == set()
+
+# ==================== GENERALES ====================
+
+def test_init_db_es_idempotente(db):
+    db.init_db()
+    assert len(db.obtener_usuarios()) == 5
+    assert len(db.obtener_todas_habitaciones()) == 30
+    with db.conexion() as conn:
+        assert db.motor.leer_version(conn) == len(db.MIGRACIONES)
+
+
+def test_conexion_revierte_si_hay_error(db):
+    try:
+        with db.conexion(escritura=True) as conn:
+            conn.execute("UPDATE usuarios SET nombre = 'X' WHERE id = 1")
+            raise RuntimeError
+    except RuntimeError:
+        pass
+    assert db.obtener_usuarios()[0][1] == 'Administrador'
+
+    # Tras cerrarlas se vuelven a abrir al pedir la siguiente
+    db.cerrar_conexiones()
+    assert db.obtener_ultimo_reporte_id() == 0
+
+# ==================== USUARIOS ====================
+
+def test_verificar_usuario(db):
+    assert db.verificar_usuario('admin', 'admin123') == (1, 'Administrador', 'admin')
+    assert db.verificar_usuario('admin', 'otra') is None
+    assert db.verificar_usuario('nadie', 'admin123') is None
+
+
+def test_password_en_texto_plano_se_migra_al_entrar(db):
+    with db.conexion(escritura=True) as conn:
+        conn.execute("INSERT INTO usuarios (nombre, usuario, password, rol) VALUES ('Eva', 'eva', 'clave', 'camarera')")
+    db.invalidar_cache_usuarios()
+
+    assert db.verificar_usuario('eva', 'clave')[1] == 'Eva'
+    guardada = next(u[3] for u in db.obtener_usuarios() if u[2] == 'eva')
+    assert db.es_hash(guardada)
+
+
+def test_alta_cambio_y_baja_de_usuario(db):
+    db.crear_usuario('Eva Díaz', 'eva', 'clave', 'camarera')
+    assert db.verificar_usuario('eva', 'clave')[1:] == ('Eva Díaz', 'camarera')
+    assert ('Eva Díaz',) in [(nombre,) for _, nombre in db.obtener_camareras_activas()]
+
+    id = db.verificar_usuario('eva', 'clave')[0]
+    db.actualizar_usuario(id, 'Eva Díaz', 'eva', '', 'jefa')
+    assert db.verificar_usuario('eva', 'clave')[2] == 'jefa'
+    db.actualizar_usuario(id, 'Eva Díaz', 'eva', 'nueva', 'camarera')
+    assert db.verificar_usuario('eva', 'clave') is None
+    assert db.verificar_usuario('eva', 'nueva') is not None
+
+    db.eliminar_usuario(id)
+    assert db.verificar_usuario('eva', 'nueva') is None
+    assert id not in [cid for cid, _ in db.obtener_camareras_activas()]
+
+
+def test_hashear_password(db):
+    guardado = db.hashear_password('secreta')
+    assert db.es_hash(guardado)
+    assert db._comprobar_password(guardado, 'secreta')
+    assert not db._comprobar_password(guardado, 'otra')
+
+# ==================== HABITACIONES ====================
+
+def test_catalogo_de_habitaciones(db):
+    version = db.version_habitaciones()
+    assert db.obtener_habitaciones()[0] == ('101', 1, 'Sencilla')
+
+    db.crear_habitacion('401', 4, 'Suite')
+    assert db.version_habitaciones() != version
+    assert ('401', 4, 'Suite') in db.obtener_habitaciones()
+
+    id = next(h[0] for h in db.obtener_todas_habitaciones() if h[1] == '401')
+    db.actualizar_habitacion(id, '401', 4, 'Doble')
+    assert ('401', 4, 'Doble') in db.obtener_habitaciones()
+
+    db.eliminar_habitacion(id)
+    assert '401' not in [h[0] for h in db.obtener_habitaciones()]
+    assert (id, '401', 4, 'Doble', 0) in db.obtener_todas_habitaciones()
+
+
+def test_estado_de_habitaciones_hoy(db):
+    db.guardar_reporte(_reporte('101', '09:00:00', estado='Necesita mantenimiento'))
+    db.guardar_reporte(_reporte('101', '11:00:00'))
+    db.guardar_reporte(_reporte('102', '10:00:00', fecha=(date.today() - timedelta(days=1)).isoformat()))
+
+    estado = {fila[0]: fila[3:] for fila in db.obtener_estado_habitaciones_hoy()}
+    assert estado['101'] == ('Limpia y lista', '11:00:00')
+    assert estado['102'] == (None, None)
+    assert len(estado) == 30
+
+# ==================== REPORTES ====================
+
+def test_guardar_reporte_es_idempotente(db):
+    id = db.guardar_reporte(_reporte(idempotencia='k1'))
+    assert db.guardar_reporte(_reporte(idempotencia='k1', habitacion='102')) == id
+    assert db.buscar_reporte_por_idempotencia('k1') == id
+    assert db.buscar_reporte_por_idempotencia('otra') is None
+    assert db.buscar_reporte_por_idempotencia('') is None
+    assert db.buscar_reportes_por_idempotencia(['k1', 'otra', '']) == {'k1': id}
+    assert db.obtener_ultimo_reporte_id() == id
+    assert len(db.obtener_reportes_hoy()) == 1
+
+
+def test_guardar_reportes_en_lote(db):
+    previo = db.guardar_reporte(_reporte(idempotencia='a'))
+    resultado = db.guardar_reportes([
+        _reporte('102', idempotencia='a'),
+        _reporte('103', idempotencia='b'),
+        _reporte('104', idempotencia='b'),
+        _reporte('105'),
+    ])
+
+    assert resultado[0] == (previo, False)
+    assert resultado[1][1] is True
+    assert resultado[2] == (resultado[1][0], False)
+    assert resultado[3][1] is True
+    assert sorted(r[1] for r in db.obtener_reportes_hoy()) == ['101', '103', '105']
+
+
+def test_reportes_de_hoy(db):
+    primero = db.guardar_reporte(_reporte('101', '09:00:00'))
+    segundo = db.guardar_reporte(_reporte('102', '10:00:00', observaciones='Falta toalla'))
+    db.guardar_reporte(_reporte('103', fecha='2020-01-01'))
+
+    assert [r[0] for r in db.obtener_reportes_hoy()] == [segundo, primero]
+    assert [r[0] for r in db.obtener_reportes_hoy(desde_id=primero)] == [segundo]
+    assert db.obtener_version_reportes_hoy() == (HOY, 2, segundo, 0)
+
+    estadisticas = db.obtener_estadisticas_hoy()
+    assert (estadisticas['total'], estadisticas['limpias'], estadisticas['pendientes']) == (30, 2, 28)
+    assert estadisticas['con_observaciones'] == 1
+    assert estadisticas['por_camarera'] == [
+        {'nombre': 'María González', 'habitaciones': 2, 'reportes': 2, 'con_observaciones': 1}
+    ]
+
+
+def test_reportes_nuevos_se_confirman_en_orden_de_id(db, monkeypatch):
+    """Un cliente que avanza desde_id no se salta un reporte que se confirmó más tarde con un id menor"""
+    primero_dentro, soltar = threading.Event(), threading.Event()
+    actualizar_kpis = repositorio._actualizar_kpis
+
+    def kpis_lentos(conn, filas):
+        if not primero_dentro.is_set():
+            primero_dentro.set()
+            soltar.wait(10)
+        actualizar_kpis(conn, filas)
+
+    monkeypatch.setattr(repositorio, '_actualizar_kpis', kpis_lentos)
+    with ThreadPoolExecutor(2) as hilos:
+        lento = hilos.submit(db.guardar_reporte, _reporte('101'))
+        assert primero_dentro.wait(10)
+        rapido = hilos.submit(db.guardar_reporte, _reporte('102'))
+        try:
+            rapido.result(timeout=1)
+        except TimeoutError:
+            pass
+
+        vistos = [r[0] for r in db.obtener_reportes_hoy()]
+        desde_id = max(vistos, default=0)
+        soltar.set()
+        ids = {lento.result(), rapido.result()}
+
+    vistos += [r[0] for r in db.obtener_reportes_hoy(desde_id)]
+    assert set(vistos) == ids
+
+
+def test_detalle_de_reportes(db):
+    id = db.guardar_reporte(_reporte(observaciones='Mancha', foto_path='a.jpg'))
+    detalle = db.obtener_reporte_detalle(id)
+    assert detalle[:6] == (id, '101', 3, 'María González', HOY, '10:00:00')
+    assert detalle[9:11] == ('Mancha', 'a.jpg')
+    assert db.obtener_reporte_detalle(id + 1) is None
+    assert db.obtener_reportes_detalle([id, id + 1]) == [detalle]
+
+
+def test_paginar_e_iterar_reportes(db):
+    ids = [db.guardar_reporte(_reporte(f'10{i}', f'1{i}:00:00')) for i in range(1, 8)]
+    db.guardar_reporte(_reporte('201', camarera_id=4, camarera_nombre='Ana López'))
+
+    paginas, siguiente = [], None
+    while True:
+        reportes, siguiente = db.obtener_reportes_paginados({'camarera_id': 3}, siguiente, limite=3)
+        paginas.append([r[0] for r in reportes])
+        if siguiente is None:
+            break
+    assert paginas == [ids[::-1][:3], ids[::-1][3:6], ids[::-1][6:]]
+
+    assert [r[0] for r in db.iterar_reportes({'camarera_id': 3}, lote=2)] == ids[::-1]
+    assert len(list(db.iterar_reportes())) == 8
+
+
+def test_eliminar_reporte_libera_fotos_sin_uso(db):
+    uno = db.guardar_reporte(_reporte('101', foto_path='compartida.jpg'))
+    dos = db.guardar_reporte(_reporte('102', foto_path='compartida.jpg'))
+
+    assert db.eliminar_reporte(uno) == []
+    assert db.eliminar_reporte(dos) == ['compartida.jpg']
+    assert db.eliminar_reporte(dos) == []
+    assert db.obtener_reportes_hoy() == []
+    assert db.obtener_kpis()['por_dia'] == []
+
+
+def test_fotos_de_reportes(db):
+    id = db.guardar_reporte(_reporte(foto_path='original.jpg'))
+
+    assert db.reemplazar_fotos_reporte(id, 'procesada.jpg', 'mini.jpg') == ['original.jpg']
+    assert db.obtener_rutas_fotos() == ['mini.jpg', 'procesada.jpg']
+    # El reporte desapareció mientras se procesaba: las fotos nuevas quedan sin uso
+    assert db.reemplazar_fotos_reporte(id + 1, 'otra.jpg', '') == ['otra.jpg']
+
+    db.reubicar_foto('procesada.jpg', 'ab/procesada.jpg')
+    assert db.obtener_rutas_fotos() == ['ab/procesada.jpg', 'mini.jpg']
+    assert db.eliminar_reporte(id) == ['ab/procesada.jpg', 'mini.jpg']
+
+
+def test_cambiar_fotos_cambia_la_version_de_hoy(db):
+    id = db.guardar_reporte(_reporte(foto_path='original.jpg'))
+    versiones = [db.obtener_version_reportes_hoy()]
+
+    db.reemplazar_fotos_reporte(id, 'procesada.jpg', 'mini.jpg')
+    versiones.append(db.obtener_version_reportes_hoy())
+    db.reubicar_foto('procesada.jpg', 'ab/procesada.jpg')
+    versiones.append(db.obtener_version_reportes_hoy())
+    db.reubicar_foto('no-existe.jpg', 'cd/no-existe.jpg')
+    versiones.append(db.obtener_version_reportes_hoy())
+
+    assert [v[3] for v in versiones] == [0, 1, 2, 2]
+    assert {v[:3] for v in versiones} == {(HOY, 1, id)}
+
+
+def test_buscar_reportes(db):
+    grifo = db.guardar_reporte(_reporte('101', observaciones='El grifo del baño gotea'))
+    db.guardar_reporte(_reporte('201', observaciones='Habitación con olor a humedad'))
+    db.guardar_reporte(_reporte('102', observaciones='Todo bien'))
+
+    resultados, siguiente = db.buscar_reportes('grifo')
+    assert [(detalle[0], siguiente) for detalle, _ in resultados] == [(grifo, None)]
+    assert f'{db.MARCA_INICIO}grifo{db.MARCA_FIN}' in resultados[0][1]
+
+    # Sin distinguir tildes ni mayúsculas y como prefijo
+    assert [d[1] for d, _ in db.buscar_reportes('HABITACION')[0]] == ['201']
+    assert [d[1] for d, _ in db.buscar_reportes('humed')[0]] == ['201']
+    assert db.buscar_reportes('olor', {'piso': 1})[0] == []
+    assert db.buscar_reportes('olor', {'habitacion': '201'})[0] != []
+    assert db.buscar_reportes('"*:') == ([], None)
+
+
+def test_buscar_reportes_recorre_todas_las_paginas(db):
+    # Relevancias repetidas y distintas: el cursor desempata por id
+    textos = ['Cortina rota', 'Cortina rota en la ventana del baño', 'Cortina cortina']
+    ids = [db.guardar_reporte(_reporte(f'{i % 3 + 1}0{i % 10 + 1}', observaciones=textos[i % 3]))
+           for i in range(25)]
+
+    vistos, siguiente, paginas = [], None, 0
+    while True:
+        resultados, siguiente = db.buscar_reportes('cortina', despues=siguiente, limite=4)
+        vistos += [detalle[0] for detalle, _ in resultados]
+        paginas += 1
+        if siguiente is None:
+            break
+
+    assert sorted(vistos) == sorted(ids)
+    assert paginas == 7
+    # Primero el texto con más apariciones; a igual relevancia, del más reciente al más antiguo
+    assert vistos[:8] == ids[2::3][::-1]
+
+
+def test_archivo_historico(db):
+    if not hasattr(db.motor, 'archivar_reportes'):
+        pytest.skip('Solo SQLite tiene archivo histórico')
+    fechas = [('2024-01-05', '09:00:00'), ('2024-01-20', '11:00:00'), ('2024-02-03', '10:00:00'),
+              ('2024-02-28', '08:00:00')]
+    ids = {db.guardar_reporte(_reporte(f'10{i + 1}', hora, fecha=fecha)): (fecha, hora)
+           for i, (fecha, hora) in enumerate(fechas)}
+    grifo = db.guardar_reporte(_reporte('201', '12:00:00', fecha='2024-01-10', observaciones='El grifo gotea'))
+    ids[grifo] = ('2024-01-10', '12:00:00')
+    assert db.motor.archivar_reportes(dias=30) == 5
+
+    # Importados después en meses ya archivados: quedan en reportes
+    for fecha, hora in [('2024-01-20', '10:00:00'), ('2024-02-28', '09:00:00'), (HOY, '07:00:00')]:
+        ids[db.guardar_reporte(_reporte('301', hora, fecha=fecha))] = (fecha, hora)
+    esperado = sorted(ids, key=lambda id: (*ids[id], id), reverse=True)
+
+    vistos, siguiente = [], None
+    while True:
+        reportes, siguiente = db.obtener_reportes_paginados(despues=siguiente, limite=2)
+        vistos += [r[0] for r in reportes]
+        if siguiente is None:
+            break
+    assert vistos == esperado
+    assert [r[0] for r in db.iterar_reportes(lote=2)] == esperado
+    assert [r[0] for r in db.obtener_reportes_paginados({'desde': '2024-02-01', 'hasta': '2024-02-28'})[0]] \
+        == [id for id in esperado if ids[id][0].startswith('2024-02')]
+
+    assert [d[0] for d, _ in db.buscar_reportes('grifo')[0]] == [grifo]
+    assert db.obtener_reporte_detalle(grifo)[1] == '201'
+    db.eliminar_reporte(grifo)
+    assert db.obtener_reporte_detalle(grifo) is None
+    assert db.buscar_reportes('grifo') == ([], None)
+    assert len(list(db.iterar_reportes())) == len(esperado) - 1
+
+# ==================== TAREAS ====================
+
+def test_catalogo_de_tareas(db):
+    assert [nombre for _, nombre in db.obtener_tareas()] == list(db.TAREAS_INICIALES)
+    assert db.mascara_tareas(['Cambio de sábanas', 'Vaciado de basura']) == 0b100001
+
+    db.crear_tarea(' Minibar ')
+    assert db.mascara_tareas(['Minibar']) == 1 << 6
+
+    db.activar_tarea(6, False)
+    assert 'Minibar' not in [nombre for _, nombre in db.obtener_tareas()]
+    assert (6, 'Minibar', 0) in db.obtener_todas_tareas()
+    # Un reporte offline pudo marcar la tarea antes de desactivarla
+    assert db.mascara_tareas(['Minibar']) == 1 << 6
+
+
+def test_tareas_invalidas(db):
+    for nombre in ('', 'a, b'):
+        try:
+            db.crear_tarea(nombre)
+        except ValueError:
+            pass
+        else:
+            raise AssertionError(f'crear_tarea({nombre!r}) no falló')
+    try:
+        db.mascara_tareas(['No existe'])
+    except ValueError:
+        pass
+    else:
+        raise AssertionError('mascara_tareas no falló con una tarea desconocida')
+
+
+def test_tareas_creadas_a_la_vez_no_comparten_bit(db):
+    with ThreadPoolExecutor(4) as pool:
+        list(pool.map(db.crear_tarea, [f'Tarea {i}' for i in range(8)]))
+    bits = [bit for bit, _, _ in db.obtener_todas_tareas()]
+    assert sorted(bits) == list(range(14))
+
+
+def test_cumplimiento_de_tareas(db):
+    db.guardar_reporte(_reporte('101', tareas_mask=0b11))
+    db.guardar_reporte(_reporte('201', tareas_mask=0b01))
+
+    cumplimiento = db.obtener_cumplimiento_tareas(HOY)
+    assert cumplimiento['reportes'] == 2
+    por_tarea = {t['tarea']: (t['hechas'], t['omitidas']) for t in cumplimiento['tareas']}
+    assert por_tarea['Cambio de sábanas'] == (2, 0)
+    assert por_tarea['Limpieza de baño'] == (1, 1)
+    assert db.obtener_cumplimiento_tareas(HOY, piso=2)['reportes'] == 1
+
+# ==================== KPIs ====================
+
+def test_kpis(db):
+    db.guardar_reporte(_reporte('101', '09:00:00'))
+    db.guardar_reporte(_reporte('102', '09:30:00', estado='Necesita mantenimiento'))
+    db.guardar_reporte(_reporte('102', '10:00:00', camarera_id=4, camarera_nombre='Ana López'))
+
+    kpis = db.obtener_kpis()
+    assert kpis['por_dia'] == [{'fecha': HOY, 'reportes': 3, 'mantenimiento': 1}]
+    maria = next(c for c in kpis['por_camarera'] if c['camarera_id'] == 3)
+    assert (maria['reportes'], maria['minutos_por_habitacion']) == (2, 30.0)
+    assert kpis['mantenimiento_por_habitacion'][0]['habitacion'] == '102'
+
+    assert db.reconstruir_kpis() == 2
+    assert db.obtener_kpis() == kpis
+
+
+def test_kpis_con_escrituras_a_la_vez(db):
+    def guardar(i):
+        db.guardar_reporte(_reporte(f'{i % 3 + 1}0{i % 10 + 1}', f'{8 + i // 6:02d}:{i % 6 * 10:02d}:00'))
+
+    with ThreadPoolExecutor(8) as pool:
+        list(pool.map(guardar, range(40)))
+
+    kpis = db.obtener_kpis()
+    assert kpis['por_dia'] == [{'fecha': HOY, 'reportes': 40, 'mantenimiento': 0}]
+    db.reconstruir_kpis()
+    assert db.obtener_kpis() == kpis
+
+# ==================== ASIGNACIONES ====================
+
+def test_duraciones_de_limpieza(db):
+    db.guardar_reporte(_reporte('101', '09:00:00'))
+    db.guardar_reporte(_reporte('102', '09:20:00'))
+    db.guardar_reporte(_reporte('103', '09:21:00'))
+    db.guardar_reporte(_reporte('104', '12:00:00'))
+
+    assert db.obtener_duraciones_limpieza() == [('102', 'Doble', 1, 20.0)]
+
+
+def test_asignaciones(db):
+    db.guardar_reporte(_reporte('102'))
+
+    def planificar(filas, hechas):
+        assert (filas, hechas) == ([], {'102': 3})
+        return [('101', 3, 1, 25.0), ('102', 3, 2, 30.0), ('103', 4, 1, 25.0)]
+
+    assert db.replanificar_asignaciones(HOY, planificar) is True
+    assert db.replanificar_asignaciones(HOY, lambda filas, hechas: None) is False
+
+    asignaciones = db.obtener_asignaciones(HOY)
+    assert [(a[0], a[3], a[7]) for a in asignaciones] == [('101', 3, 0), ('102', 3, 1), ('103', 4, 0)]
+    assert asignaciones[0][4] == 'María González'
+    assert [a[0] for a in db.obtener_asignaciones(HOY, camarera_id=4)] == ['103']
+    assert db.contar_pendientes(HOY, 3) == 1
+    assert db.contar_pendientes(HOY, 5) == 0
@@ -0,0 +1,6 @@
+# Punto de entrada para servidores WSGI de producción (gunicorn, waitress...)
+#   gunicorn -c gunicorn.conf.py wsgi:app
+#   waitress-serve --port=3000 wsgi:app
+from app import app
+
+application = app